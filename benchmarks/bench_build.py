@@ -0,0 +1,291 @@
+#!/usr/bin/env python3
+"""
+Build benchmark: time build.py on synthetic content trees of increasing size.
+
+Generates a content/ tree with the given numbers of posts (realistic front matter with series,
+aliases, external links and drafts, and bodies with fenced code, tables, footnotes, <details>
+blocks and sibling images), next to copies of templates/ and static/. Each site is then built
+twice in a separate process:
+
+- cold: from scratch, without the render cache
+- noop: an incremental rebuild with nothing changed
+
+For each build it records wall and CPU time, the wall time of every Builder phase (from
+build.py --profile) and the peak RSS of the build process. Results can be saved as a baseline
+and later runs compared against it: the script exits with status 1 if any metric regressed by
+more than the threshold. The committed baseline.json covers 100, 1000 and 10000 posts; timings
+are machine dependent, so refresh it with --save-baseline on the machine that runs --compare.
+
+Usage: python benchmarks/bench_build.py [--sizes 100 1000 10000 100000] [--jobs 1]
+                                        [--save-baseline | --compare] [--threshold 0.2]
+"""
+
+import os
+import sys
+import json
+import time
+import zlib
+import random
+import shutil
+import struct
+import argparse
+import subprocess
+from pathlib import Path
+from datetime import date, timedelta
+
+REPO_DIR = Path(__file__).resolve().parent.parent
+BUILD_SCRIPT = REPO_DIR / 'build.py'
+BASELINE_PATH = Path(__file__).resolve().parent / 'baseline.json'
+WORK_DIR = REPO_DIR / '.cache' / 'bench'
+
+# Number of distinct images; posts share them, like posts reusing diagrams and covers
+IMAGE_VARIANTS = 6
+IMAGE_SIZE = (1200, 675)
+
+SERIES = [f'Synthetic Series {i}' for i in range(20)]
+
+WORDS = (
+    'pipeline retriever reader ranker document embedding model prompt agent tool graph component '
+    'latency throughput cache index query vector token context window benchmark dataset evaluation'
+).split()
+
+# Phases faster than this (in seconds) are too noisy to flag as regressions
+NOISE_FLOOR = 0.05
+
+
+def png_bytes(width, height, seed):
+    """Encode a gradient PNG without depending on Pillow"""
+    rows = []
+    for y in range(height):
+        row = bytearray([0])  # filter type: none
+        for x in range(width):
+            row += bytes(((x + seed * 40) % 256, (y + seed * 70) % 256, (x + y) * seed % 256))
+        rows.append(bytes(row))
+
+    def chunk(kind, data):
+        return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data))
+
+    header = struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0)
+    return (
+        b'\x89PNG\r\n\x1a\n' + chunk(b'IHDR', header) + chunk(b'IDAT', zlib.compress(b''.join(rows), 6))
+        + chunk(b'IEND', b'')
+    )
+
+
+def sentence(rng, words=12):
+    return ' '.join(rng.choice(WORDS) for _ in range(words)).capitalize() + '.'
+
+
+def paragraph(rng, i):
+    parts = [sentence(rng) for _ in range(rng.randint(3, 6))]
+    parts.insert(1, f'See the [previous post](/posts/{i}/) or the [docs](https://example.com/docs/{rng.randint(0, 999)}).')
+    return ' '.join(parts)
+
+
+def post_body(rng, i, images):
+    """Markdown body of a synthetic post"""
+    blocks = [paragraph(rng, i), f'## {sentence(rng, 4)[:-1]}', paragraph(rng, i)]
+    if images:
+        blocks.append(f'![{sentence(rng, 3)[:-1]}]({images[0]})')
+    blocks.append(
+        '```python\n'
+        + '\n'.join(f'{rng.choice(WORDS)}_{n} = {rng.choice(WORDS)}({n})' for n in range(rng.randint(4, 12)))
+        + '\n```'
+    )
+    blocks.append(paragraph(rng, i) + '[^1]')
+    blocks.append(
+        '| Component | Latency (ms) | Recall |\n|---|---|---|\n'
+        + '\n'.join(f'| {rng.choice(WORDS)} | {rng.randint(1, 500)} | 0.{rng.randint(10, 99)} |' for _ in range(5))
+    )
+    blocks.append(
+        f'<details>\n<summary>{sentence(rng, 4)}</summary>\n\n{paragraph(rng, i)}\n\n'
+        f'- {sentence(rng, 5)}\n- {sentence(rng, 5)}\n\n</details>'
+    )
+    for image in images[1:]:
+        blocks.append(f'![{sentence(rng, 3)[:-1]}]({image})')
+    blocks.append(paragraph(rng, i))
+    blocks.append(f'[^1]: {sentence(rng, 8)}')
+    return '\n\n'.join(blocks) + '\n'
+
+
+def front_matter(rng, title, day, slug):
+    """YAML front matter of a synthetic post, with the mix of fields real posts use"""
+    lines = [f'title: "{title}"', f'description: "{sentence(rng, 8)}"', f'date: {day.isoformat()}', 'author: "ZanSara"']
+    roll = rng.random()
+    if roll < 0.05:
+        lines.append(f'external-link: https://example.com/articles/{slug}')
+    elif roll < 0.07:
+        lines.append('draft: true')
+    if rng.random() < 0.15:
+        lines.append(f'series: ["{rng.choice(SERIES)}"]')
+    if rng.random() < 0.05:
+        lines.append(f'aliases:\n - /posts/old-{slug}')
+    return '---\n' + '\n'.join(lines) + '\n---\n'
+
+
+def link_or_copy(src, dest):
+    try:
+        os.link(src, dest)
+    except OSError:
+        shutil.copyfile(src, dest)
+
+
+def generate_site(site_dir, posts, seed=0):
+    """
+    Generate a site with the given number of posts, unless it was already generated. Templates and
+    static files are copied from the repository again every time, so they are never stale.
+    """
+    marker = site_dir / '.generated'
+    if site_dir.exists() and not marker.exists():
+        shutil.rmtree(site_dir)
+    for name in ('templates', 'static'):
+        shutil.rmtree(site_dir / name, ignore_errors=True)
+        shutil.copytree(REPO_DIR / name, site_dir / name)
+    if marker.exists():
+        return
+    rng = random.Random(seed)
+
+    content_dir = site_dir / 'content'
+    content_dir.mkdir(parents=True)
+    for page in ('about.md', 'cards.md'):
+        shutil.copyfile(REPO_DIR / 'content' / page, content_dir / page)
+
+    images_dir = site_dir / '.images'
+    images_dir.mkdir()
+    image_paths = []
+    for n in range(IMAGE_VARIANTS):
+        path = images_dir / f'{n}.png'
+        path.write_bytes(png_bytes(*IMAGE_SIZE, seed=n + 1))
+        image_paths.append(path)
+
+    first_day = date(2015, 1, 1)
+    for i in range(posts):
+        section = 'talks' if i % 10 == 9 else 'posts'
+        day = first_day + timedelta(days=i * 3650 // max(posts, 1))
+        slug = f'{day.isoformat()}-synthetic-{i}'
+        post_dir = content_dir / section / slug
+        post_dir.mkdir(parents=True)
+
+        images = []
+        if rng.random() < 0.6:
+            for n in range(rng.randint(1, 2)):
+                name = f'figure-{n}.png'
+                link_or_copy(rng.choice(image_paths), post_dir / name)
+                images.append(name)
+        title = f'Synthetic post {i}: {sentence(rng, 4)[:-1]}'
+        text = front_matter(rng, title, day, slug)
+        if images and rng.random() < 0.5:
+            text = text.replace('\n---\n', f'\nfeatured-image: "{images[0]}"\n---\n', 1)
+        (post_dir / 'post.md').write_text(text + post_body(rng, i, images), encoding='utf-8')
+
+    shutil.rmtree(images_dir)
+    marker.touch()
+
+
+def run_build(site_dir, name, args):
+    """Run build.py in site_dir and return its metrics"""
+    profile_dir = site_dir / '.cache' / 'profile'
+    command = [sys.executable, str(BUILD_SCRIPT), '--in-place', '--profile', str(profile_dir), *args]
+    start = time.perf_counter()
+    process = subprocess.Popen(command, cwd=site_dir, stdout=subprocess.DEVNULL)
+    # wait4 reports the peak RSS of the build and its (render) worker processes
+    _, status, usage = os.wait4(process.pid, 0)
+    wall = time.perf_counter() - start
+    process.returncode = os.waitstatus_to_exitcode(status)
+    if process.returncode:
+        raise RuntimeError(f'{name} build in {site_dir} failed with status {process.returncode}')
+
+    with open(profile_dir / 'profile.json', encoding='utf-8') as f:
+        report = json.load(f)
+    return {
+        'wall': wall,
+        'cpu': usage.ru_utime + usage.ru_stime,
+        'peak_rss_mb': usage.ru_maxrss / 1024,
+        'bytes_written': report['bytes_written'],
+        'phases': {phase: total['wall'] for phase, total in report['phases'].items()},
+    }
+
+
+def benchmark(size, jobs):
+    """Cold and no-op builds of a synthetic site with the given number of posts"""
+    site_dir = WORK_DIR / f'site-{size}'
+    start = time.perf_counter()
+    generate_site(site_dir, size)
+    print(f'{size} posts: generated in {time.perf_counter() - start:.1f}s', flush=True)
+
+    for stale in ('public', '.cache'):
+        shutil.rmtree(site_dir / stale, ignore_errors=True)
+    results = {
+        'cold': run_build(site_dir, 'cold', ['--no-cache', '-j', str(jobs)]),
+        'noop': run_build(site_dir, 'noop', ['--incremental', '-j', str(jobs)]),
+    }
+    for scenario, result in results.items():
+        print(
+            f'  {scenario:<5} {result["wall"]:8.2f}s wall {result["cpu"]:8.2f}s CPU '
+            f'{result["peak_rss_mb"]:8.1f} MB peak RSS', flush=True
+        )
+    return results
+
+
+def compare(results, baseline, threshold):
+    """Print how results compare to the baseline and return the regressions"""
+    regressions = []
+    for size, scenarios in results.items():
+        for scenario, result in scenarios.items():
+            base = baseline.get(size, {}).get(scenario)
+            if not base:
+                continue
+            metrics = [('wall', result['wall'], base['wall']), ('peak RSS', result['peak_rss_mb'], base['peak_rss_mb'])]
+            metrics += [
+                (phase, seconds, base['phases'][phase]) for phase, seconds in result['phases'].items()
+                if phase in base['phases'] and max(seconds, base['phases'][phase]) >= NOISE_FLOOR
+            ]
+            for metric, value, base_value in metrics:
+                change = value / base_value - 1 if base_value else 0.0
+                flag = ''
+                if change > threshold:
+                    flag = '  REGRESSION'
+                    regressions.append((size, scenario, metric, change))
+                print(f'  {size:>6} {scenario:<5} {metric:<28} {base_value:10.3f} -> {value:10.3f} ({change:+.0%}){flag}')
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        '--sizes', type=int, nargs='+', default=[100, 1000],
+        help='numbers of posts to benchmark (the full scaling curve is 100 1000 10000 100000)'
+    )
+    parser.add_argument('-j', '--jobs', type=int, default=1, help='render processes passed to build.py')
+    parser.add_argument('--save-baseline', action='store_true', help=f'store the results in {BASELINE_PATH.name}')
+    parser.add_argument('--compare', action='store_true', help='compare the results against the stored baseline')
+    parser.add_argument(
+        '--threshold', type=float, default=0.2, help='relative slowdown that counts as a regression (default: 0.2)'
+    )
+    parser.add_argument('--output', help='also write the results as JSON to this file')
+    args = parser.parse_args()
+
+    WORK_DIR.mkdir(parents=True, exist_ok=True)
+    results = {str(size): benchmark(size, args.jobs) for size in args.sizes}
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=1)
+    if args.save_baseline:
+        baseline = json.loads(BASELINE_PATH.read_text(encoding='utf-8')) if BASELINE_PATH.exists() else {}
+        baseline.update(results)
+        BASELINE_PATH.write_text(json.dumps(baseline, indent=1) + '\n', encoding='utf-8')
+        print(f'Baseline saved to {BASELINE_PATH}')
+    if args.compare:
+        if not BASELINE_PATH.exists():
+            sys.exit(f'No baseline at {BASELINE_PATH}, run with --save-baseline first')
+        print(f'\nComparison with {BASELINE_PATH.name} (threshold {args.threshold:.0%}):')
+        regressions = compare(results, json.loads(BASELINE_PATH.read_text(encoding='utf-8')), args.threshold)
+        if regressions:
+            print(f'{len(regressions)} regressions')
+            sys.exit(1)
+        print('No regressions')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark: markdown renderer pool vs. a new renderer per conversion.
+
+Renders a synthetic post with many <details> blocks, whose inner markdown is converted by
+preprocess_html_tags_with_markdown, once with fresh renderers (the old behaviour) and once
+with the shared renderer pool.
+
+Usage: python benchmarks/bench_renderer_pool.py [--blocks 200] [--repeat 5]
+"""
+
+import sys
+import argparse
+import tempfile
+from pathlib import Path
+from timeit import timeit
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import build  # noqa: E402
+
+
+DETAILS_BLOCK = '''<details>
+<summary>Question {i}</summary>
+
+Some **bold** text, a [link](https://example.com/{i}) and a list:
+
+- one
+- two
+
+```python
+print({i})
+```
+
+</details>
+
+'''
+
+
+class FreshRendererPool:
+    """Stand-in for RENDERER_POOL that builds a new renderer for every conversion"""
+
+    def convert(self, text, use_nl2br=False):
+        return build.create_markdown_renderer(use_nl2br).convert(text)
+
+
+def make_post(directory, blocks):
+    """Write a post with the given number of <details> blocks and return its path"""
+    post_dir = Path(directory) / 'posts' / 'details-heavy'
+    post_dir.mkdir(parents=True)
+    body = ''.join(DETAILS_BLOCK.format(i=i) for i in range(blocks))
+    post_path = post_dir / 'post.md'
+    post_path.write_text(f'---\ntitle: Details\ndate: 2024-01-01\n---\n\n{body}', encoding='utf-8')
+    return post_path
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--blocks', type=int, default=200, help='number of <details> blocks in the post')
+    parser.add_argument('--repeat', type=int, default=5, help='renders per variant')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        page = build.ContentFile(make_post(directory, args.blocks), base_dir=directory)
+
+        pooled_pool = build.RENDERER_POOL
+        page.render()  # warm up the pool
+        pooled_html = page.html_content
+        pooled = timeit(page.render, number=args.repeat) / args.repeat
+
+        build.RENDERER_POOL = FreshRendererPool()
+        try:
+            fresh = timeit(page.render, number=args.repeat) / args.repeat
+            fresh_html = page.html_content
+        finally:
+            build.RENDERER_POOL = pooled_pool
+
+    assert pooled_html == fresh_html, 'pooled and fresh renderers produced different HTML'
+    print(f'{args.blocks} <details> blocks, {args.repeat} renders each')
+    print(f'  new renderer per conversion: {fresh * 1000:8.1f} ms/render')
+    print(f'  renderer pool:               {pooled * 1000:8.1f} ms/render')
+    print(f'  speedup:                     {fresh / pooled:8.2f}x')
+
+
+if __name__ == '__main__':
+    main()
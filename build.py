@@ -4,16 +4,67 @@ Static site generator.
 Parses markdown files with YAML front matter and generates HTML pages, RSS feeds, and sitemap.
 """
 
+import io
+import os
+import errno
+import ctypes
 import re
+import json
+import gzip
 import shutil
+import hashlib
+import urllib.request
+import argparse
 import posixpath
+import time
+import threading
 import yaml
 import markdown
+import pygments
+from markdown.extensions import Extension
+from markdown.extensions.codehilite import CodeHilite, HiliteTreeprocessor
+from markdown.extensions.fenced_code import FencedBlockPreprocessor
+from watchdog.events import FileSystemEventHandler
+from watchdog.observers import Observer
 from pathlib import Path
-from datetime import datetime
-from collections import defaultdict
-from xml.etree.ElementTree import Element, SubElement, tostring
-from html import escape
+from datetime import datetime, timezone
+from operator import attrgetter
+from collections import Counter, defaultdict
+from contextlib import ExitStack, contextmanager
+from functools import partial, wraps
+from string import Formatter
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from html import escape, unescape
+
+try:
+    import fcntl
+except ImportError:  # not available on Windows
+    fcntl = None
+
+try:
+    renameat2 = ctypes.CDLL(None, use_errno=True).renameat2
+except (AttributeError, OSError, TypeError):  # Linux only (glibc 2.28+)
+    renameat2 = None
+
+try:
+    import brotli
+except ImportError:  # only gzip sidecars without it
+    brotli = None
+
+try:
+    from PIL import Image
+except ImportError:  # responsive images are skipped without Pillow
+    Image = None
+
+try:
+    import fontTools
+    from fontTools import subset as font_subset
+except ImportError:  # Google Fonts are linked instead of self-hosted subsets without fontTools
+    fontTools = font_subset = None
+
+# ioctl that clones a file's extents on copy-on-write filesystems (Linux)
+FICLONE = 0x40049409
 
 
 # Site configuration
@@ -29,12 +80,129 @@ FAVICON_SVG = '/assets/avatar/avatar.svg'
 FAVICON_32 = '/assets/avatar/avatar.png'
 SINCE_YEAR = 2023
 
+# Sections included in the main feed
+FEED_SECTIONS = ['posts', 'talks', 'demos', 'projects', 'publications']
+
+# Sections listed on the homepage
+HOME_SECTIONS = ['posts', 'talks']
+
+# Number of recent items of each section shown on the homepage
+HOME_ITEMS = 4
+
+# Number of items on each page of the section and series listings (0 puts all of them on one page)
+LIST_PAGE_SIZE = 24
+
+# Number of items in each feed
+FEED_ITEMS = 20
+
+# Files written for the main feed and for each section feed, by format
+FEED_FORMATS = {'rss': 'index.xml', 'atom': 'atom.xml', 'json': 'feed.json'}
+
+# Embed a plain-text excerpt of each page in the feeds instead of its full HTML, to keep them small
+FEED_EXCERPTS = False
+FEED_EXCERPT_LENGTH = 500
+
+# Limits of a single sitemap file (from the sitemap protocol); bigger sitemaps are split under a sitemap index
+SITEMAP_MAX_URLS = 50000
+SITEMAP_MAX_BYTES = 50 * 1024 * 1024
+
+# Page aliases are published as small redirect pages, or as hardlinks to the page itself
+ALIAS_MODES = ('redirect', 'hardlink')
+# Redirect maps of every alias and short URL, so the web server can answer with a 301 directly:
+# a _redirects file (Netlify, Cloudflare Pages) and an nginx map include
+REDIRECT_MAPS = {'netlify': '_redirects', 'nginx': 'redirects.map'}
+REDIRECT_STATUS = 301
+
+# Client-side search index, written to public/search/ and sharded by the first characters of each term
+SEARCH_DIR = 'search'
+SEARCH_PREFIX_LENGTH = 2
+SEARCH_MIN_TERM_LENGTH = 2
+# Leave code blocks out of the search index
+SEARCH_EXCLUDE_CODE = True
+# Each occurrence of a term in a page title counts as this many in the text
+SEARCH_TITLE_WEIGHT = 5
+SEARCH_STOPWORDS = frozenset(
+    'a an and are as at be but by for from has have in is it its of on or that the this to was were with'.split()
+)
+SEARCH_INDEX_VERSION = 2
+# Page ids are kept across builds (in the manifest), even for removed pages, until more than this
+# share of them is unused: then every page gets a new id
+SEARCH_MAX_UNUSED_IDS = 0.25
+SEARCH_CACHE_MAX_BYTES = 64 * 1024 * 1024
+SEARCH_SCRIPT_URL = '/js/search.js'
+
+# Templates used by every HTML page, and by every content page on top of its page template
+BASE_TEMPLATES = (
+    'base.html', 'header.html', 'menu-item.html', 'footer.html', 'fonts.html', 'google-fonts.html',
+    'stylesheet.html', 'critical-css.html',
+)
+PAGE_TEMPLATES = ('description.html', 'date.html', 'featured-image.html', 'meta-image.html')
+
+# Widths of the WebP variants generated for raster images in post bundles (needs Pillow), on top
+# of one at the native width of the image
+IMAGE_WIDTHS = (480, 960, 1600)
+IMAGE_EXTENSIONS = ('png', 'jpg', 'jpeg')
+IMAGE_QUALITY = 80
+# libwebp effort, from 0 (fastest) to 6 (smallest): 2 encodes about 1.5x faster than libwebp's
+# default of 4, for files about 4% bigger
+IMAGE_WEBP_METHOD = 2
+
+# "sizes" of responsive images in articles (content column is 800px wide) and in listings
+ARTICLE_IMAGE_SIZES = '(max-width: 850px) 100vw, 800px'
+THUMBNAIL_IMAGE_SIZES = '(max-width: 650px) 100vw, 400px'
+
+# Text outputs that get precompressed sidecars, and the minimum size reduction to keep one
+COMPRESSIBLE_EXTENSIONS = ('html', 'xml', 'css', 'js', 'json', 'svg', 'txt')
+COMPRESSION_MIN_SAVING = 0.1
+
+# Files in static/ that get content-hashed copies, and the manifest listing them
+FINGERPRINT_EXTENSIONS = ('css', 'js', 'svg', 'png', 'jpg', 'jpeg', 'gif', 'webp', 'ico', 'woff', 'woff2', 'ttf', 'otf')
+ASSET_MANIFEST = 'assets-manifest.json'
+
+# Static assets referenced by the templates every page uses
+STYLESHEET_URL = '/css/style.css'
+# Inline the rules of the stylesheet each page needs in its <head>, and load the whole stylesheet
+# without blocking rendering
+INLINE_CRITICAL_CSS = True
+
+# Web fonts, subset at build time to the characters of the rendered pages from sources vendored in
+# static/ (the sources themselves aren't published). Only the families style.css uses are listed.
+# `python build.py fetch-fonts` downloads missing sources from the Google Fonts repository, to be
+# committed; builds never download anything. Without fontTools, or while a source is missing,
+# templates/google-fonts.html links Google Fonts instead (unless --require-fonts is given).
+FONT_FACES = [
+    {'family': 'Noto Serif', 'style': 'normal', 'weight': '100 900',
+     'source': 'static/fonts/noto-serif/NotoSerif[wdth,wght].ttf',
+     'url': 'https://raw.githubusercontent.com/google/fonts/main/ofl/notoserif/NotoSerif%5Bwdth,wght%5D.ttf'},
+    {'family': 'Noto Serif', 'style': 'italic', 'weight': '100 900',
+     'source': 'static/fonts/noto-serif/NotoSerif-Italic[wdth,wght].ttf',
+     'url': 'https://raw.githubusercontent.com/google/fonts/main/ofl/notoserif/NotoSerif-Italic%5Bwdth,wght%5D.ttf'},
+]
+FONT_DOWNLOAD_TIMEOUT = 30
+FONT_STYLESHEET = 'fonts/fonts.css'
+# Always in the subsets, so new text in the most common characters renders right until the next build
+FONT_BASE_CHARSET = ''.join(chr(c) for c in range(0x20, 0x7f))
+FONT_CACHE_MAX_BYTES = 32 * 1024 * 1024
+
+# Build state kept between runs (manifest, caches)
+CACHE_DIR = Path('.cache')
+
+# Size cap of the rendered markdown cache. Least recently used entries are evicted past it.
+RENDER_CACHE_MAX_BYTES = 64 * 1024 * 1024
+
+# Bump this when a change to the rendering code changes the HTML it produces
+RENDER_CACHE_VERSION = 2
+
+# Size cap of the cache of code blocks highlighted by Pygments
+HIGHLIGHT_CACHE_MAX_BYTES = 32 * 1024 * 1024
+
 MENU_ITEMS = [
     {'name': 'About', 'weight': 1, 'url': 'about'},
     {'name': 'Posts', 'weight': 2, 'url': 'posts/'},
     {'name': 'Projects', 'weight': 3, 'url': 'projects/'},
     {'name': 'Publications', 'weight': 5, 'url': 'publications/'},
     {'name': 'Talks', 'weight': 6, 'url': 'talks/'},
+    {'name': 'Search', 'weight': 7, 'url': 'search/'},
 ]
 
 MARKDOWN_EXTENSIONS = [
@@ -77,21 +245,392 @@ def resolve_relative_path(value, base_url):
     return posixpath.normpath(posixpath.join(base_url, value))
 
 
-def create_markdown_renderer(use_nl2br=False):
-    """Create a markdown renderer with consistent extensions."""
+def is_invertible_image(image_path):
+    """True if the image's filename (before extension) ends with -inv, like image-inv.png"""
+    return bool(image_path) and re.search(r'-inv\.[^/]*$', image_path) is not None
+
+
+def is_external_link(href):
+    """True if a link points outside the site and should open in a new tab"""
+    # Absolute URLs with scheme or protocol-relative URLs are external by default.
+    # Relative paths (e.g. assets/figure.png, ./page, ../page) are internal.
+    has_scheme = re.match(r'^[a-zA-Z][a-zA-Z0-9+.-]*:', href) is not None
+    is_protocol_relative = href.startswith('//')
+    is_internal = (
+        href.startswith('/') or
+        href.startswith('#') or
+        href.startswith('./') or
+        href.startswith('../') or
+        (not has_scheme and not is_protocol_relative) or
+        href.startswith(BASE_URL) or
+        href.startswith('mailto:') or
+        href.startswith('tel:')
+    )
+    return not is_internal
+
+
+def hash_bytes(data):
+    """Return the hex SHA-256 digest of some bytes."""
+    return hashlib.sha256(data).hexdigest()
+
+
+def hash_file(path):
+    """Return the hex SHA-256 digest of a file's contents, or '' if it doesn't exist."""
+    path = Path(path)
+    if not path.exists():
+        return ''
+    return hash_bytes(path.read_bytes())
+
+
+def same_content(path, other_path, chunk_size=1 << 16):
+    """Return whether two files have the same contents (False if the second doesn't exist), reading them in chunks"""
+    try:
+        if os.path.getsize(path) != os.path.getsize(other_path):
+            return False
+    except FileNotFoundError:
+        return False
+    with open(path, 'rb') as f, open(other_path, 'rb') as other:
+        while True:
+            chunk = f.read(chunk_size)
+            if chunk != other.read(chunk_size):
+                return False
+            if not chunk:
+                return True
+
+
+# renameat2() arguments: relative paths are resolved from the working directory, and the
+# two paths are swapped atomically (both must exist)
+AT_FDCWD = -100
+RENAME_EXCHANGE = 2
+
+
+def exchange_paths(a, b):
+    """
+    Atomically swap two paths with renameat2(RENAME_EXCHANGE).
+
+    Return False, leaving both paths untouched, where that isn't supported (outside Linux, or on
+    file systems without it).
+    """
+    if renameat2 is None:
+        return False
+    if renameat2(AT_FDCWD, os.fsencode(a), AT_FDCWD, os.fsencode(b), RENAME_EXCHANGE) == 0:
+        return True
+    error = ctypes.get_errno()
+    if error in (errno.ENOSYS, errno.EINVAL, errno.ENOTSUP):
+        return False
+    raise OSError(error, os.strerror(error), str(a), None, str(b))
+
+
+def config_hash(*options):
+    """
+    Hash of the build configuration.
+
+    The configuration lives in this script, so any change to it invalidates every output.
+    The current year is included too, because the footer prints it, and so are the command
+    line options that change the outputs.
+    """
+    return hash_bytes(Path(__file__).read_bytes() + str(datetime.now().year).encode() + repr(options).encode())
+
+
+class DiskCache:
+    """
+    Size-capped on-disk key/value store for build artifacts.
+
+    Each entry is a file named after its key. Reading an entry refreshes its mtime, so pruning
+    the cache evicts the least recently used entries first.
+    """
+
+    def __init__(self, directory, max_bytes):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(*parts):
+        """Build a cache key out of any number of strings"""
+        return hash_bytes('\0'.join(parts).encode('utf-8'))
+
+    def _path(self, key):
+        return self.directory / key[:2] / key
+
+    def get(self, key):
+        """Return the bytes stored under key, or None on a miss"""
+        path = self._path(key)
+        try:
+            data = path.read_bytes()
+        except OSError:
+            self.misses += 1
+            return None
+        os.utime(path)
+        self.hits += 1
+        return data
+
+    def set(self, key, data):
+        """Store bytes under key"""
+        path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Write to a temporary file first so concurrent builds never see half-written entries
+        tmp_path = path.with_name(f'{key}.{os.getpid()}.tmp')
+        tmp_path.write_bytes(data)
+        os.replace(tmp_path, path)
+
+    def prune(self):
+        """Evict least recently used entries until the cache fits in max_bytes. Returns the count."""
+        if not self.directory.exists():
+            return 0
+        entries = []
+        total = 0
+        for path in self.directory.rglob('*'):
+            if path.is_file():
+                stat = path.stat()
+                entries.append((stat.st_mtime, stat.st_size, path))
+                total += stat.st_size
+        evicted = 0
+        for _, size, path in sorted(entries, key=lambda e: e[0]):
+            if total <= self.max_bytes:
+                break
+            path.unlink()
+            total -= size
+            evicted += 1
+        return evicted
+
+
+def render_fingerprint():
+    """Everything besides the page itself that the rendered HTML depends on"""
+    return json.dumps([
+        RENDER_CACHE_VERSION,
+        MARKDOWN_EXTENSIONS,
+        MARKDOWN_EXTENSION_CONFIGS,
+        markdown.__version__,
+        pygments.__version__,
+        BASE_URL,
+    ], sort_keys=True)
+
+
+class CachedFencedBlockPreprocessor(FencedBlockPreprocessor):
+    """fenced_code's preprocessor, taking the HTML of blocks seen before from a cache"""
+
+    def __init__(self, md, config, cache):
+        super().__init__(md, config)
+        self.cache = cache
+        self.fingerprint = highlight_fingerprint()
+
+    def run(self, lines):
+        stash = self.md.htmlStash
+        text = '\n'.join(lines)
+        index = 0
+        while m := self.FENCED_BLOCK_RE.search(text, index):
+            key = DiskCache.key(self.fingerprint, 'fenced', m.group(0))
+            cached = self.cache.get(key)
+            if cached is not None:
+                placeholder = stash.store(cached.decode('utf-8'))
+            else:
+                # Let fenced_code highlight the block on its own, and keep the HTML it stashed
+                stored = len(stash.rawHtmlBlocks)
+                super().run(m.group(0).split('\n'))
+                if len(stash.rawHtmlBlocks) == stored:
+                    # Not a valid block, fenced_code left it as it is
+                    index = m.end('attrs')
+                    continue
+                placeholder = stash.get_placeholder(stored)
+                self.cache.set(key, stash.rawHtmlBlocks[stored].encode('utf-8'))
+            text = f'{text[:m.start()]}\n{placeholder}\n{text[m.end():]}'
+            index = m.start() + 1 + len(placeholder)
+        return text.split('\n')
+
+
+class CachedHiliteTreeprocessor(HiliteTreeprocessor):
+    """codehilite's treeprocessor (indented code blocks), taking the HTML of blocks seen before from a cache"""
+
+    def __init__(self, md, config, cache):
+        super().__init__(md)
+        self.config = config
+        self.cache = cache
+        self.fingerprint = highlight_fingerprint()
+
+    def run(self, root):
+        for block in root.iter('pre'):
+            if len(block) != 1 or block[0].tag != 'code' or block[0].text is None:
+                continue
+            key = DiskCache.key(self.fingerprint, 'indented', block[0].text)
+            cached = self.cache.get(key)
+            if cached is not None:
+                code = cached.decode('utf-8')
+            else:
+                local_config = self.config.copy()
+                code = CodeHilite(
+                    self.code_unescape(block[0].text),
+                    tab_length=self.md.tab_length,
+                    style=local_config.pop('pygments_style', 'default'),
+                    **local_config
+                ).hilite()
+                self.cache.set(key, code.encode('utf-8'))
+            placeholder = self.md.htmlStash.store(code)
+            block.clear()
+            block.tag = 'p'
+            block.text = placeholder
+
+
+class HighlightCacheExtension(Extension):
+    """
+    Cross-build cache of the code blocks highlighted by Pygments through codehilite.
+
+    Replaces the processors of fenced_code and codehilite (which must be loaded first) with
+    versions keyed by the source of each block, so pages sharing a snippet, and pages rendered
+    again for any other reason, skip Pygments for the blocks seen before. The cache is a DiskCache,
+    which can be shared by the render worker processes.
+    """
+
+    def __init__(self, cache):
+        super().__init__()
+        self.cache = cache
+
+    def extendMarkdown(self, md):
+        fenced = md.preprocessors['fenced_code_block']
+        md.preprocessors.register(CachedFencedBlockPreprocessor(md, fenced.config, self.cache), 'fenced_code_block', 25)
+        hiliter = md.treeprocessors['hilite']
+        md.treeprocessors.register(CachedHiliteTreeprocessor(md, hiliter.config, self.cache), 'hilite', 30)
+
+
+def highlight_fingerprint():
+    """Everything besides the code block itself that its highlighted HTML depends on"""
+    return json.dumps([
+        MARKDOWN_EXTENSIONS,
+        MARKDOWN_EXTENSION_CONFIGS,
+        markdown.__version__,
+        pygments.__version__,
+    ], sort_keys=True)
+
+
+def create_markdown_renderer(use_nl2br=False, highlight_cache=None):
+    """
+    Create a markdown renderer with consistent extensions, taking highlighted code blocks from
+    highlight_cache (a DiskCache) if given.
+    """
     extensions = list(MARKDOWN_EXTENSIONS)
     if use_nl2br:
         extensions.append('nl2br')
+    if highlight_cache is not None:
+        extensions.append(HighlightCacheExtension(highlight_cache))
     return markdown.Markdown(
         extensions=extensions,
         extension_configs=MARKDOWN_EXTENSION_CONFIGS
     )
 
 
+class MarkdownRendererPool:
+    """
+    Pool of reusable markdown renderers.
+
+    Setting up a renderer with all its extensions is expensive, so instead of creating one per
+    conversion, renderers are kept per variant (with or without nl2br) and cleaned up with
+    Markdown.reset() between uses. A renderer is only ever used by one thread at a time.
+    Renderers highlight code through highlight_cache when it's set (see configure()).
+    """
+
+    def __init__(self):
+        self._free = defaultdict(list)
+        self._lock = threading.Lock()
+        self.highlight_cache = None
+
+    def configure(self, highlight_directory):
+        """Cache highlighted code blocks in highlight_directory, or not at all if it's None"""
+        with self._lock:
+            self._free.clear()
+            self.highlight_cache = (
+                DiskCache(highlight_directory, HIGHLIGHT_CACHE_MAX_BYTES) if highlight_directory is not None else None
+            )
+
+    @contextmanager
+    def renderer(self, use_nl2br=False):
+        """Borrow a renderer of the given variant for the duration of the with block"""
+        with self._lock:
+            free = self._free[use_nl2br]
+            md = free.pop() if free else None
+        if md is None:
+            md = create_markdown_renderer(use_nl2br, self.highlight_cache)
+        try:
+            yield md
+        finally:
+            md.reset()
+            with self._lock:
+                self._free[use_nl2br].append(md)
+
+    def convert(self, text, use_nl2br=False):
+        """Convert markdown text to HTML with a pooled renderer"""
+        with self.renderer(use_nl2br) as md:
+            return md.convert(text)
+
+
+RENDERER_POOL = MarkdownRendererPool()
+
+
+def configure_highlight_cache(directory):
+    """Point the highlight cache of this process (e.g. a render worker) to directory"""
+    RENDERER_POOL.configure(directory)
+
+
 # Template loader
+class Template:
+    """
+    A template compiled for repeated rendering.
+
+    The text is parsed once into literal parts and {fields}. bind() fills in the fields that are
+    the same on every page and pre-joins them with the literal text around them, so render()
+    only substitutes what varies, in a single str.format call.
+    """
+    _formatter = Formatter()
+
+    def __init__(self, parts):
+        # [(literal text, field name or None, format spec, conversion)]
+        self.parts = parts
+        self._format = ''.join(
+            literal.replace('{', '{{').replace('}', '}}')
+            + ('' if field is None else '{' + field + (f'!{conversion}' if conversion else '') + (f':{spec}' if spec else '') + '}')
+            for literal, field, spec, conversion in parts
+        )
+
+    @classmethod
+    def compile(cls, text):
+        return cls(list(cls._formatter.parse(text)))
+
+    @property
+    def fields(self):
+        """Names of the fields left to fill in"""
+        return {field for _, field, _, _ in self.parts if field is not None}
+
+    def bind(self, **values):
+        """A new template with the given fields filled in"""
+        parts = []
+        literal = ''
+        for text, field, spec, conversion in self.parts:
+            literal += text
+            if field in values:
+                value = self._formatter.convert_field(values[field], conversion)
+                literal += self._formatter.format_field(value, spec or '')
+            elif field is not None:
+                parts.append((literal, field, spec, conversion))
+                literal = ''
+        if literal:
+            parts.append((literal, None, None, None))
+        return Template(parts)
+
+    def render(self, **values):
+        """Fill in the remaining fields"""
+        return self._format.format_map(values)
+
+
 class TemplateLoader:
-    """Load and cache HTML templates"""
+    """
+    Load and cache HTML templates, compiled templates and the fragments rendered from them.
+
+    Fragments are pieces of HTML shared by many pages (the header and footer, list entries),
+    rendered once per build. reset() starts over, e.g. after templates or assets changed.
+    """
     _cache = {}
+    _compiled = {}
+    _fragments = {}
 
     @classmethod
     def load(cls, template_name):
@@ -102,20 +641,214 @@ class TemplateLoader:
                 cls._cache[template_name] = f.read()
         return cls._cache[template_name]
 
+    @classmethod
+    def compiled(cls, template_name):
+        """Load a template file as a compiled Template"""
+        if template_name not in cls._compiled:
+            cls._compiled[template_name] = Template.compile(cls.load(template_name))
+        return cls._compiled[template_name]
+
+    @classmethod
+    def fragment(cls, key, render):
+        """Return the fragment stored under key, calling render() to make it the first time"""
+        if key not in cls._fragments:
+            cls._fragments[key] = render()
+        return cls._fragments[key]
+
+    @classmethod
+    def reset(cls):
+        cls._cache.clear()
+        cls._compiled.clear()
+        cls._fragments.clear()
+
+
+class HTMLTag:
+    """
+    A single start tag found by HTMLPostProcessor.
+
+    Attributes are edited in place in the tag's source text, so everything the rewriters don't
+    touch (attribute order, quoting, spacing) is preserved byte for byte.
+    """
+    ATTR_PATTERN = re.compile(r'''([^\s"'=<>/]+)(?:\s*=\s*(?:"([^"]*)"|'([^']*)'|([^\s"'=<>`]+)))?''')
+
+    def __init__(self, name, text):
+        self.name = name
+        self.text = text
+
+    def _find(self, attr):
+        for match in self.ATTR_PATTERN.finditer(self.text, len(self.name) + 1):
+            if match.group(1).lower() == attr:
+                return match
+        return None
+
+    def get(self, attr, default=None):
+        """Return the value of an attribute ('' if it has no value), or default if it's missing"""
+        match = self._find(attr)
+        if match is None:
+            return default
+        for group in (2, 3, 4):
+            if match.group(group) is not None:
+                return match.group(group)
+        return ''
+
+    def set(self, attr, value):
+        """Set an attribute. The value is inserted as is, so it must already be escaped."""
+        match = self._find(attr)
+        if match is None:
+            if self.text.endswith('/>'):
+                self.text = f'{self.text[:-2].rstrip()} {attr}="{value}" />'
+            else:
+                self.text = f'{self.text[:-1]} {attr}="{value}">'
+            return
+        for group in (2, 3, 4):
+            if match.group(group) is not None:
+                start, end = match.span(group)
+                break
+        else:
+            start, end = match.span()
+            value = f'{attr}="{value}"'
+        self.text = self.text[:start] + value + self.text[end:]
+
+    def add_tokens(self, attr, tokens):
+        """Append space-separated tokens (e.g. classes) to an attribute, creating it if needed"""
+        value = self.get(attr)
+        self.set(attr, f'{value} {tokens}' if value else tokens)
+
+
+class HTMLPostProcessor:
+    """
+    Apply attribute rewrites to rendered HTML in a single pass.
+
+    Rewriters are functions taking an HTMLTag and the context given to process() (for
+    POST_PROCESSOR, the ContentFile being rendered), registered for one or more tag names (or
+    for every tag). The document is scanned once and each start tag is
+    handed to the rewriters registered for it, in registration order. New rewrites therefore
+    don't add another scan of the whole document.
+    """
+    TAG_PATTERN = re.compile(r'''<([a-zA-Z][a-zA-Z0-9-]*)(?:"[^"]*"|'[^']*'|[^'">])*>''')
+
+    def __init__(self):
+        self._rewriters = []
+        self._by_tag = {}
+
+    def register(self, func, *tags):
+        """Register a rewriter for the given tag names, or for every tag if none are given"""
+        self._rewriters.append((frozenset(tag.lower() for tag in tags), func))
+        self._by_tag = {}
+
+    def rewriter(self, *tags):
+        """Decorator form of register()"""
+        def decorator(func):
+            self.register(func, *tags)
+            return func
+        return decorator
+
+    def _rewriters_for(self, name):
+        if name not in self._by_tag:
+            self._by_tag[name] = [func for tags, func in self._rewriters if not tags or name in tags]
+        return self._by_tag[name]
+
+    def process(self, html_content, context, timings=None):
+        """
+        Run all rewriters over the start tags of html_content, passing context to each of them.
+
+        If a timings dict is given, the time spent in each rewriter is added to it.
+        """
+        def repl(match):
+            name = match.group(1).lower()
+            rewriters = self._rewriters_for(name)
+            if not rewriters:
+                return match.group(0)
+            tag = HTMLTag(name, match.group(0))
+            for func in rewriters:
+                if timings is None:
+                    func(tag, context)
+                else:
+                    start = time.perf_counter()
+                    func(tag, context)
+                    key = f'postprocess:{func.__name__}'
+                    timings[key] = timings.get(key, 0.0) + time.perf_counter() - start
+            return tag.text
+
+        return self.TAG_PATTERN.sub(repl, html_content)
+
+
+POST_PROCESSOR = HTMLPostProcessor()
+
+
+@POST_PROCESSOR.rewriter()
+def resolve_relative_urls(tag, page):
+    """
+    Resolve relative src/href references against the page's URL.
+
+    Lets markdown reference sibling assets by filename (e.g. cover.png) or
+    assets in other bundles via path navigation (e.g. ../other-post/img.png).
+    Any relative src (always media) is resolved; relative href is resolved
+    only when it targets an asset file, so relative page links are untouched.
+    Absolute paths, anchors, and external/scheme URLs are left untouched.
+    """
+    for attr in ('src', 'href'):
+        value = tag.get(attr)
+        if is_relative_asset_path(value) and (attr == 'src' or is_asset_target(value)):
+            tag.set(attr, resolve_relative_path(value, page.url))
+
+
+@POST_PROCESSOR.rewriter('img')
+def add_invertible_class_to_images(tag, page):
+    """
+    Add 'invertible' class to images whose filename ends with -inv
+
+    For example: image-inv.png -> <img ... class="invertible">
+    """
+    if is_invertible_image(tag.get('src')):
+        tag.add_tokens('class', 'invertible')
+
+
+@POST_PROCESSOR.rewriter('a')
+def add_target_blank_to_external_links(tag, page):
+    """
+    Add target="_blank" and rel="noopener noreferrer" to external links.
+
+    Internal links (starting with /, #, or the BASE_URL) open in the same window.
+    Special protocols (mailto:, tel:) are left unchanged.
+    External links open in a new tab.
+    """
+    href = tag.get('href')
+    if not href or not is_external_link(href):
+        return
+    if tag.get('target') is None:
+        tag.set('target', '_blank')
+    tag.add_tokens('rel', 'noopener noreferrer')
+
 
 class ContentFile:
-    """Represents a markdown content file"""
+    """
+    Represents a markdown content file.
+
+    Only the front matter is read up front. The body is read the first time it's needed and,
+    like the rendered HTML, dropped again by release(), so pages cost memory in proportion to
+    their metadata rather than their content.
+    """
+
+    __slots__ = (
+        'path', 'base_dir', 'front_matter', 'html_content', 'is_rendered', 'section', 'url',
+        'title', 'date', 'description', 'featured_image', 'series', 'external_link', 'aliases',
+        'show_date', 'is_draft', '_content', '_body_offset',
+    )
 
     def __init__(self, path, base_dir='content'):
         self.path = Path(path)
         self.base_dir = Path(base_dir)
         self.front_matter = {}
-        self.content = ''
         self.html_content = ''
+        self.is_rendered = False
         self.section = self._determine_section()
         self.url = self._generate_url()
+        self._content = None
+        self._body_offset = 0
 
         self._parse()
+        self._read_fields()
 
     def _determine_section(self):
         """Determine the section from the file path"""
@@ -138,19 +871,85 @@ class ContentFile:
         return f"/{stem}/"
 
     def _parse(self):
-        """Parse the markdown file and extract front matter"""
+        """
+        Parse the YAML front matter, and remember where the body starts.
+
+        The front matter sits between two '---' lines; blank lines after the closing one are
+        not part of the body. Without a closed front matter, the whole file is the body.
+        """
         with open(self.path, 'r', encoding='utf-8') as f:
-            content = f.read()
+            line = f.readline()
+            if line.rstrip() != '---' or not line.endswith('\n'):
+                return
+            lines = []
+            while True:
+                line = f.readline()
+                if not line:
+                    return
+                if line.rstrip() == '---' and line.endswith('\n') and lines:
+                    break
+                lines.append(line)
+            while True:
+                offset = f.tell()
+                line = f.readline()
+                if line.strip() or not line.endswith('\n'):
+                    break
+        self.front_matter = yaml.safe_load(''.join(lines)) or {}
+        self._body_offset = offset
+
+    def _read_fields(self):
+        """Derive the page metadata from the front matter, once"""
+        fm = self.front_matter
+        self.title = fm.get('title', '')
+        self.date = self._parse_date(fm.get('date'))
+        self.description = fm.get('description', '')
+
+        img = fm.get('featured-image', '')
+        if is_relative_asset_path(img):
+            img = resolve_relative_path(img, self.url)
+        self.featured_image = img
 
-        # Extract YAML front matter
-        pattern = re.compile(r'^---\s*\n(.*?)\n---\s*\n(.*)', re.DOTALL)
-        match = pattern.match(content)
+        s = fm.get('series', [])
+        self.series = s if isinstance(s, list) else [s] if s else []
+        self.external_link = fm.get('external-link', '')
+        a = fm.get('aliases', [])
+        self.aliases = a if isinstance(a, list) else [a] if a else []
+        self.show_date = bool(fm.get('show-date', True))
+        self.is_draft = bool(fm.get('draft', False))
 
-        if match:
-            self.front_matter = yaml.safe_load(match.group(1)) or {}
-            self.content = match.group(2)
-        else:
-            self.content = content
+    @staticmethod
+    def _parse_date(d):
+        if isinstance(d, datetime):
+            return d
+        if d:
+            # Handle both date and datetime objects from YAML
+            try:
+                if isinstance(d, str):
+                    return datetime.fromisoformat(str(d))
+                else:
+                    # YAML date object - convert to datetime
+                    return datetime.combine(d, datetime.min.time())
+            except Exception:
+                pass
+        return datetime.now()
+
+    def _read_body(self):
+        with open(self.path, 'r', encoding='utf-8') as f:
+            f.seek(self._body_offset)
+            return f.read()
+
+    @property
+    def content(self):
+        """The markdown body, read from disk on first use"""
+        if self._content is None:
+            self._content = self._read_body()
+        return self._content
+
+    def release(self):
+        """Drop the body and the rendered HTML; both are loaded again when needed"""
+        self._content = None
+        self.html_content = ''
+        self.is_rendered = False
 
     def preprocess_html_tags_with_markdown(self, content):
         """
@@ -168,11 +967,9 @@ class ContentFile:
             tag_attrs = match.group(2)
             inner_content = match.group(3)
 
-            # Create a temporary markdown renderer for the inner content
-            # Don't use nl2br here as it interferes with HTML tags
-            md = create_markdown_renderer()
             # Convert the markdown content
-            rendered_content = md.convert(inner_content)
+            # Don't use nl2br here as it interferes with HTML tags
+            rendered_content = RENDERER_POOL.convert(inner_content)
 
             # Return the tag with rendered content
             return f'<{tag_name}{tag_attrs}>\n\n{rendered_content}\n\n</{tag_name}>'
@@ -186,11 +983,9 @@ class ContentFile:
         def replace_summary_details_match(match):
             inner_content = match.group(1)
 
-            # Create a temporary markdown renderer for the inner content
-            # Don't use nl2br here as it interferes with HTML tags
-            md = create_markdown_renderer()
             # Convert the markdown content
-            rendered_content = md.convert(inner_content)
+            # Don't use nl2br here as it interferes with HTML tags
+            rendered_content = RENDERER_POOL.convert(inner_content)
 
             # Return with rendered content
             return f'</summary>\n\n{rendered_content}\n\n</details>'
@@ -202,185 +997,508 @@ class ContentFile:
 
         return processed
 
-    def resolve_relative_urls(self, html_content):
+    def render(self, timings=None):
         """
-        Resolve relative src/href references against this page's URL.
+        Render markdown content to HTML.
 
-        Lets markdown reference sibling assets by filename (e.g. cover.png) or
-        assets in other bundles via path navigation (e.g. ../other-post/img.png).
-        Any relative src (always media) is resolved; relative href is resolved
-        only when it targets an asset file, so relative page links are untouched.
-        Absolute paths, anchors, and external/scheme URLs are left untouched.
+        If a timings dict is given, the time spent in each step is recorded in it (for --profile).
         """
-        def repl(match):
-            attr, quote, value = match.group(1), match.group(2), match.group(3)
-            if is_relative_asset_path(value) and (attr == 'src' or is_asset_target(value)):
-                value = resolve_relative_path(value, self.url)
-            return f'{attr}={quote}{value}{quote}'
-
-        return re.sub(r'(src|href)=("|\')([^"\']+)\2', repl, html_content)
+        start = time.perf_counter()
+        # First preprocess HTML tags with markdown content
+        preprocessed_content = self.preprocess_html_tags_with_markdown(self.content)
+        preprocessed = time.perf_counter()
 
-    def add_invertible_class_to_images(self, html_content):
-        """
-        Add 'invertible' class to images whose filename ends with -inv
+        html_content = RENDERER_POOL.convert(preprocessed_content, use_nl2br=True)
+        converted = time.perf_counter()
 
-        For example: image-inv.png -> <img ... class="invertible">
-        """
-        def replace_img(match):
-            img_tag = match.group(0)
-            src = match.group(1)
+        # Resolve relative URLs, mark invertible images and open external links in a new tab
+        self.html_content = POST_PROCESSOR.process(html_content, self, timings)
+        self.is_rendered = True
 
-            # Check if the filename (before extension) ends with -inv
-            # Pattern: something-inv.ext
-            if re.search(r'-inv\.[^/]*$', src):
-                # Check if class attribute already exists
-                if 'class=' in img_tag:
-                    # Append to existing class attribute
-                    img_tag = re.sub(
-                        r'class="([^"]*)"',
-                        r'class="\1 invertible"',
-                        img_tag
-                    )
-                else:
-                    # Add class attribute before the closing /> or >
-                    # Handle both self-closing and regular tags
-                    if img_tag.endswith('/>'):
-                        img_tag = img_tag[:-2] + ' class="invertible" />'
-                    else:
-                        img_tag = img_tag[:-1] + ' class="invertible">'
-
-            return img_tag
-
-        # Match <img> tags and capture the src attribute
-        pattern = r'<img[^>]+src="([^"]+)"[^>]*/?>'
-        return re.sub(pattern, replace_img, html_content)
-
-    def add_target_blank_to_external_links(self, html_content):
-        """
-        Add target="_blank" and rel="noopener noreferrer" to external links.
-
-        Internal links (starting with /, #, or the BASE_URL) open in the same window.
-        Special protocols (mailto:, tel:) are left unchanged.
-        External links open in a new tab.
-        """
-        def replace_link(match):
-            link_tag = match.group(0)
-            href = match.group(1)
-
-            # Absolute URLs with scheme or protocol-relative URLs are external by default.
-            # Relative paths (e.g. assets/figure.png, ./page, ../page) are internal.
-            has_scheme = re.match(r'^[a-zA-Z][a-zA-Z0-9+.-]*:', href) is not None
-            is_protocol_relative = href.startswith('//')
-            is_internal = (
-                href.startswith('/') or
-                href.startswith('#') or
-                href.startswith('./') or
-                href.startswith('../') or
-                (not has_scheme and not is_protocol_relative) or
-                href.startswith(BASE_URL) or
-                href.startswith('mailto:') or
-                href.startswith('tel:')
+        if timings is not None:
+            end = time.perf_counter()
+            timings.update(
+                start=start, pid=os.getpid(), total=end - start,
+                preprocess=preprocessed - start, markdown=converted - preprocessed, postprocess=end - converted,
             )
 
-            # If it's an external link, add target="_blank" and rel="noopener noreferrer"
-            if not is_internal:
-                # Check if target attribute already exists
-                if 'target=' not in link_tag:
-                    # Add target="_blank" before the closing >
-                    link_tag = link_tag[:-1] + ' target="_blank">'
-
-                # Check if rel attribute already exists
-                if 'rel=' in link_tag:
-                    # Append to existing rel attribute
-                    link_tag = re.sub(
-                        r'rel="([^"]*)"',
-                        r'rel="\1 noopener noreferrer"',
-                        link_tag
-                    )
-                else:
-                    # Add rel attribute before the closing >
-                    link_tag = link_tag[:-1] + ' rel="noopener noreferrer">'
+    def render_cache_key(self, fingerprint):
+        """Key of this page's HTML in the render cache: its body and URL, plus the renderer setup"""
+        body = self._content if self._content is not None else self._read_body()
+        return DiskCache.key(fingerprint, self.url, body)
 
-            return link_tag
+    def get_effective_url(self):
+        """Get the effective URL - external link if set, otherwise internal URL"""
+        return self.external_link if self.external_link else self.url
 
-        # Match <a> tags and capture the href attribute
-        pattern = r'<a[^>]+href="([^"]+)"[^>]*>'
-        return re.sub(pattern, replace_link, html_content)
 
-    def render(self):
-        """Render markdown content to HTML"""
-        # First preprocess HTML tags with markdown content
-        preprocessed_content = self.preprocess_html_tags_with_markdown(self.content)
+def encode_webp(src, variants, quality, method):
+    """
+    Save an image as WebP at each of the given (destination, width) pairs (runs in worker
+    processes). The source is decoded once for all of its variants.
+    """
+    with Image.open(src) as image:
+        if image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGBA' if 'transparency' in image.info or image.mode in ('P', 'LA') else 'RGB')
+        for dest, width in variants:
+            resized = image
+            if width != image.width:
+                size = (width, round(image.height * width / image.width))
+                resized = image.resize(size, Image.LANCZOS, reducing_gap=3.0)
+            dest = Path(dest)
+            dest.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = dest.with_name(f'{dest.name}.{os.getpid()}.tmp')
+            resized.save(tmp_path, 'WEBP', quality=quality, method=method)
+            os.replace(tmp_path, dest)
+
+
+class ImagePipeline:
+    """
+    Responsive WebP variants of the raster images in post bundles.
+
+    Each image is resized to every width in IMAGE_WIDTHS smaller than itself, and also encoded
+    at its native width so that the srcset covers every viewport. Variants are stored in a
+    content-addressed cache (by source hash, width and WebP method), so each one is encoded once,
+    and published next to their source as e.g. cover.480w.webp. rewrite() then turns <img> tags
+    pointing to images with variants into <picture> elements with a WebP srcset; variants keep
+    the -inv suffix of their source, so invertible images stay invertible.
+    """
+
+    def __init__(self, cache_dir=None, method=IMAGE_WEBP_METHOD):
+        self.cache_dir = Path(cache_dir) if cache_dir else CACHE_DIR / 'images'
+        self.method = method
+        # Image URL -> [(width, variant URL)] for every image with variants
+        self.variants = {}
+        # Variant output path (relative to public/) -> cached file
+        self.outputs = {}
+        # Source path -> signature of its variants, for the dependency graph
+        self.signatures = {}
+        self._processor = HTMLPostProcessor()
+        self._processor.register(self._rewrite_img, 'img')
+
+    @staticmethod
+    def is_available():
+        return Image is not None
+
+    def _load_index(self):
+        """Hash and size of every image seen before, keyed by path, valid while size and mtime match"""
+        try:
+            with open(self.cache_dir / 'index.json', 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _describe(self, path, index):
+        """Return (hash, width) of an image, reading it only if it changed since the last build"""
+        stat = path.stat()
+        entry = index.get(str(path))
+        if entry and entry[:2] == [stat.st_size, stat.st_mtime_ns]:
+            return entry[2], entry[3]
+        with Image.open(path) as image:
+            width = image.width
+        digest = hash_file(path)
+        index[str(path)] = [stat.st_size, stat.st_mtime_ns, digest, width]
+        return digest, width
+
+    def process(self, images, jobs=None):
+        """
+        Generate the variants of the given images, a dict of output path -> source file.
 
-        md = create_markdown_renderer(use_nl2br=True)
-        html_content = md.convert(preprocessed_content)
+        Missing variants are encoded in `jobs` worker processes (default: one per CPU). Cached
+        variants no longer used by any image are deleted.
+        """
+        jobs = jobs or os.cpu_count() or 1
+        self.variants, self.outputs, self.signatures = {}, {}, {}
+        index = self._load_index()
+        # Source -> [(cached file, width)] of the variants to encode
+        todo, queued = {}, set()
+        for output, source in sorted(images.items()):
+            try:
+                digest, width = self._describe(source, index)
+            except (OSError, Image.UnidentifiedImageError):
+                print(f'Skipping unreadable image {source}')
+                continue
+            stem = output.rsplit('.', 1)[0]
+            variants = []
+            for variant_width in [w for w in IMAGE_WIDTHS if w < width] + [width]:
+                cached = self.cache_dir / digest[:2] / f'{digest}-{variant_width}-m{self.method}.webp'
+                if cached not in queued and not cached.exists():
+                    # Identical images share their variants: encode each one only once
+                    queued.add(cached)
+                    todo.setdefault(str(source), []).append((str(cached), variant_width))
+                variant_output = f'{stem}.{variant_width}w.webp'
+                self.outputs[variant_output] = cached
+                variants.append((variant_width, '/' + variant_output))
+            self.variants['/' + output] = variants
+            self.signatures[str(source)] = DiskCache.key(digest, json.dumps(variants))
+
+        if todo:
+            # Biggest images first, so that the workers finish at about the same time
+            sources = sorted(todo, key=lambda source: -max(width for _, width in todo[source]))
+            args = (sources, [todo[s] for s in sources], [IMAGE_QUALITY] * len(todo), [self.method] * len(todo))
+            if jobs > 1 and len(todo) > 1:
+                with ProcessPoolExecutor(max_workers=jobs) as executor:
+                    list(executor.map(encode_webp, *args))
+            else:
+                list(map(encode_webp, *args))
+
+        # Keep the cache to the variants the current content uses
+        used = set(self.outputs.values())
+        for cached in self.cache_dir.glob('*/*.webp'):
+            if cached not in used:
+                cached.unlink()
+        index = {path: entry for path, entry in index.items() if Path(path).exists()}
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        with open(self.cache_dir / 'index.json', 'w', encoding='utf-8') as f:
+            json.dump(index, f)
+        return len(queued)
+
+    def srcset(self, src):
+        """srcset attribute value of the WebP variants of an image, or '' if it has none"""
+        return ', '.join(f'{url} {width}w' for width, url in self.variants.get(src, ()))
+
+    def _rewrite_img(self, tag, sizes):
+        srcset = self.srcset(tag.get('src'))
+        if srcset:
+            tag.text = f'<picture><source type="image/webp" srcset="{srcset}" sizes="{sizes}">{tag.text}</picture>'
+
+    def rewrite(self, html_content, sizes=ARTICLE_IMAGE_SIZES):
+        """Wrap images that have variants in <picture> elements offering them in WebP"""
+        if not self.variants:
+            return html_content
+        return self._processor.process(html_content, sizes)
+
+
+IMAGES = ImagePipeline()
+
+
+def unicode_range(codepoints):
+    """CSS unicode-range of a set of code points, e.g. U+20-7E, U+A9"""
+    ranges = []
+    for codepoint in sorted(codepoints):
+        if ranges and ranges[-1][1] == codepoint - 1:
+            ranges[-1][1] = codepoint
+        else:
+            ranges.append([codepoint, codepoint])
+    return ', '.join(f'U+{start:X}' if start == end else f'U+{start:X}-{end:X}' for start, end in ranges)
 
-        # Resolve relative asset/link references against this page's URL
-        html_content = self.resolve_relative_urls(html_content)
 
-        # Add invertible class to images with -inv suffix
-        html_content = self.add_invertible_class_to_images(html_content)
+class FontSubsetter:
+    """
+    Self-hosted subsets of the FONT_FACES, with only the glyphs of the characters the site uses.
 
-        # Add target="_blank" to external links
-        self.html_content = self.add_target_blank_to_external_links(html_content)
+    Each face is subset to the characters it covers out of the given charset, as WOFF2 (WOFF
+    without brotli), and declared in the FONT_STYLESHEET with its unicode-range. Subsets are
+    cached by the hash of the font source and the charset, so builds that don't change either
+    never run the subsetter. Subset files are named after their cache key, while the stylesheet
+    keeps a fixed URL: every page links it, and its contents depend on every page.
+    """
+    # Runs of ASCII characters (stripped to find the others), and entities that may stand for one
+    ASCII_PATTERN = re.compile(r'[\x00-\x7f]+')
+    ENTITY_PATTERN = re.compile(r'&(?!(?:amp|lt|gt|quot|#39|#x27);)#?\w+;')
 
-    @property
-    def title(self):
-        return self.front_matter.get('title', '')
+    def __init__(self, cache_dir=None):
+        self.cache = DiskCache(Path(cache_dir) if cache_dir else CACHE_DIR / 'fonts', FONT_CACHE_MAX_BYTES)
+        self.subset_count = 0
 
-    @property
-    def date(self):
-        d = self.front_matter.get('date')
-        if isinstance(d, datetime):
-            return d
-        if d:
-            # Handle both date and datetime objects from YAML
+    @staticmethod
+    def is_available():
+        return font_subset is not None and all(Path(face['source']).exists() for face in FONT_FACES)
+
+    @staticmethod
+    def sources():
+        return {Path(face['source']) for face in FONT_FACES}
+
+    @staticmethod
+    def fetch():
+        """Download the missing sources of the FONT_FACES (fetch-fonts command). Returns whether they all exist."""
+        for face in FONT_FACES:
+            path = Path(face['source'])
+            if path.exists():
+                continue
             try:
-                if isinstance(d, str):
-                    return datetime.fromisoformat(str(d))
-                else:
-                    # YAML date object - convert to datetime
-                    return datetime.combine(d, datetime.min.time())
-            except Exception:
-                pass
-        return datetime.now()
+                with urllib.request.urlopen(face['url'], timeout=FONT_DOWNLOAD_TIMEOUT) as response:
+                    data = response.read()
+            except OSError as e:
+                print(f'Could not download {face["url"]}: {e}')
+                return False
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = path.with_name(f'{path.name}.{os.getpid()}.tmp')
+            tmp_path.write_bytes(data)
+            os.replace(tmp_path, path)
+            print(f'Downloaded {path}')
+        return True
 
-    @property
-    def description(self):
-        return self.front_matter.get('description', '')
+    @classmethod
+    def charset(cls, html):
+        """The characters of an HTML page beyond FONT_BASE_CHARSET (or more), as a sorted string"""
+        chars = set(cls.ASCII_PATTERN.sub('', html))
+        if '&' in html:
+            chars.update(unescape(''.join(set(cls.ENTITY_PATTERN.findall(html)))))
+        return ''.join(sorted(chars))
+
+    def _subset(self, source, codepoints, flavor):
+        """Subset a font to the given code points, returning (subset bytes, code points it covers)"""
+        options = font_subset.Options()
+        options.flavor = flavor
+        font = font_subset.load_font(source, options)
+        covered = codepoints & set(font.getBestCmap())
+        if not covered:
+            return b'', covered
+        subsetter = font_subset.Subsetter(options)
+        subsetter.populate(unicodes=covered)
+        subsetter.subset(font)
+        data = io.BytesIO()
+        font_subset.save_font(font, data, options)
+        return data.getvalue(), covered
+
+    def generate(self, chars):
+        """Subset every face to chars. Returns {output: bytes} of the subsets and the stylesheet."""
+        flavor = 'woff2' if brotli else 'woff'
+        codepoints = {ord(c) for c in set(FONT_BASE_CHARSET) | set(chars)}
+        charset_key = unicode_range(codepoints)
+        outputs = {}
+        rules = []
+        self.subset_count = 0
+        for face in FONT_FACES:
+            key = DiskCache.key(fontTools.version, flavor, hash_file(face['source']), charset_key)
+            covered_key = DiskCache.key(key, 'unicode-range')
+            data, covered = self.cache.get(key), self.cache.get(covered_key)
+            if data is None or covered is None:
+                data, covered = self._subset(face['source'], codepoints, flavor)
+                covered = unicode_range(covered).encode('utf-8')
+                self.cache.set(key, data)
+                self.cache.set(covered_key, covered)
+                self.subset_count += 1
+            if not data:
+                continue
+            output = f'fonts/{face["family"].lower().replace(" ", "-")}-{face["style"]}.{key[:8]}.{flavor}'
+            outputs[output] = data
+            rules.append(
+                '@font-face {\n'
+                f'  font-family: "{face["family"]}";\n'
+                f'  font-style: {face["style"]};\n'
+                f'  font-weight: {face["weight"]};\n'
+                '  font-display: swap;\n'
+                f'  src: url("/{output}") format("{flavor}");\n'
+                f'  unicode-range: {covered.decode("utf-8")};\n'
+                '}\n'
+            )
+        outputs[FONT_STYLESHEET] = '\n'.join(rules).encode('utf-8')
+        return outputs
 
-    @property
-    def featured_image(self):
-        img = self.front_matter.get('featured-image', '')
-        if is_relative_asset_path(img):
-            img = resolve_relative_path(img, self.url)
-        return img
 
-    @property
-    def series(self):
-        s = self.front_matter.get('series', [])
-        return s if isinstance(s, list) else [s] if s else []
+FONTS = FontSubsetter()
 
-    @property
-    def external_link(self):
-        return self.front_matter.get('external-link', '')
 
-    @property
-    def aliases(self):
-        a = self.front_matter.get('aliases', [])
-        return a if isinstance(a, list) else [a] if a else []
+class AssetFingerprints:
+    """
+    Content-hashed copies of the files in static/, e.g. css/style.3f9a1c2b.css.
 
-    @property
-    def show_date(self):
-        return bool(self.front_matter.get('show-date', True))
+    Fingerprinted URLs change whenever the file does, so they can be served with long-lived
+    immutable cache headers. The originals are still published for external references.
+    url() references inside stylesheets are rewritten to fingerprinted URLs too, and the
+    stylesheet is fingerprinted after the rewrite, so a new font also busts the CSS URL.
+    """
+    CSS_URL_PATTERN = re.compile(r'''url\(\s*(["']?)([^"')]+)\1\s*\)''')
 
-    @property
-    def is_draft(self):
-        return bool(self.front_matter.get('draft', False))
+    def __init__(self):
+        # Original URL -> fingerprinted URL
+        self.urls = {}
+        # Fingerprinted output path -> source file, for files copied as they are
+        self.copies = {}
+        # Fingerprinted output path -> bytes, for rewritten stylesheets
+        self.generated = {}
+        # Source path -> content hash
+        self.digests = {}
+
+    def process(self, assets):
+        """Fingerprint the given static assets, a dict of output path -> source file"""
+        self.urls, self.copies, self.generated, self.digests = {}, {}, {}, {}
+        stylesheets = []
+        for output, source in sorted(assets.items()):
+            extension = output.rsplit('.', 1)[-1].lower() if '.' in output else ''
+            if extension == 'css':
+                stylesheets.append((output, source))
+            elif extension in FINGERPRINT_EXTENSIONS:
+                digest = hash_file(source)
+                self.copies[self._add(output, source, digest)] = source
+
+        for output, source in stylesheets:
+            base_url = '/' + posixpath.dirname(output) + '/'
+
+            def repl(match):
+                quote, value = match.group(1), match.group(2)
+                url = value if value.startswith('/') else resolve_relative_path(value, base_url)
+                if is_relative_asset_path(value) or value.startswith('/'):
+                    value = self.urls.get(url, value)
+                return f'url({quote}{value}{quote})'
+
+            data = self.CSS_URL_PATTERN.sub(repl, source.read_text(encoding='utf-8')).encode('utf-8')
+            self.generated[self._add(output, source, hash_bytes(data))] = data
+
+    def _add(self, output, source, digest):
+        stem, extension = output.rsplit('.', 1)
+        fingerprinted = f'{stem}.{digest[:8]}.{extension}'
+        self.urls['/' + output] = '/' + fingerprinted
+        self.digests[str(source)] = digest
+        return fingerprinted
+
+    def url(self, path):
+        """Fingerprinted URL of a static asset, or the path itself if it isn't fingerprinted"""
+        return self.urls.get(path, path)
+
+    def manifest(self):
+        """The asset manifest: JSON object mapping original URLs to fingerprinted ones"""
+        return json.dumps(self.urls, indent=1, sort_keys=True) + '\n'
+
+
+ASSETS = AssetFingerprints()
+
+
+def asset_url(path):
+    """URL to use in templates for a static asset"""
+    return ASSETS.url(path)
+
+
+def css_blocks(css):
+    """Split CSS into its top-level (prelude, block) pairs; block is None for statements like @import"""
+    blocks = []
+    start = depth = 0
+    prelude = None
+    quote = None
+    for i, c in enumerate(css):
+        if quote:
+            if c == quote and css[i - 1] != '\\':
+                quote = None
+        elif c in '"\'':
+            quote = c
+        elif c == '{':
+            if depth == 0:
+                prelude, start = css[start:i].strip(), i + 1
+            depth += 1
+        elif c == '}':
+            depth -= 1
+            if depth == 0:
+                blocks.append((prelude, css[start:i].strip()))
+                start = i + 1
+        elif c == ';' and depth == 0:
+            blocks.append((css[start:i].strip(), None))
+            start = i + 1
+    return blocks
+
+
+def minify_css(css):
+    """Drop the whitespace CSS doesn't need"""
+    return re.sub(r'\s*([{};,>])\s*', r'\1', re.sub(r'\s+', ' ', css)).strip()
+
+
+class CriticalCSS:
+    """
+    The rules of a stylesheet that can apply to a given page.
+
+    The stylesheet is parsed once. A selector is reduced to the tags, classes and ids it requires
+    (combinators, pseudo-classes and attribute selectors only narrow matches, so they are ignored),
+    and a rule is kept for a page that has all of them for any of its selectors. This keeps every
+    rule that can match the page as generated, and maybe a few more. Rules inside @media and
+    @supports are filtered the same way; other at-rules (@font-face, @keyframes, ...) are always
+    kept. Pages with the same tags, classes and ids share the result.
+    """
+    # Generated HTML quotes its attributes; patterns starting with a literal are much faster to scan
+    TAG_PATTERN = re.compile(r'<([a-zA-Z][\w-]*)')
+    CLASS_PATTERN = re.compile(r'class=["\']([^"\']*)')
+    ID_PATTERN = re.compile(r' id=["\']([^"\']*)')
+    GROUPING_RULES = ('@media', '@supports')
+
+    def __init__(self, css, base_url='/'):
+        css = re.sub(r'/\*.*?\*/', '', css, flags=re.DOTALL)
+
+        def absolute_url(match):
+            quote, value = match.group(1), match.group(2)
+            if is_relative_asset_path(value):
+                value = resolve_relative_path(value, base_url)
+            return f'url({quote}{value}{quote})'
+
+        # Relative URLs would resolve against the page once inlined
+        css = AssetFingerprints.CSS_URL_PATTERN.sub(absolute_url, css)
+        self.rules = self._parse(css)
+        # Tags, classes and ids of the parts every page shares
+        self.base_tokens = frozenset()
+        self._matches = {}
+
+    def _parse(self, css):
+        """[(required tokens of each selector, or None to always keep, minified rule or nested rules)]"""
+        rules = []
+        for prelude, block in css_blocks(css):
+            if block is None:
+                rules.append((None, minify_css(prelude) + ';'))
+            elif prelude.startswith(self.GROUPING_RULES):
+                rules.append((None, (minify_css(prelude), self._parse(block))))
+            elif prelude.startswith('@'):
+                rules.append((None, minify_css(f'{prelude}{{{block}}}')))
+            else:
+                selectors = [self.selector_tokens(selector) for selector in prelude.split(',')]
+                rules.append((selectors, minify_css(f'{prelude}{{{block}}}')))
+        return rules
 
-    def get_effective_url(self):
-        """Get the effective URL - external link if set, otherwise internal URL"""
-        return self.external_link if self.external_link else self.url
+    @staticmethod
+    def selector_tokens(selector):
+        """The tags ('a'), classes ('.x') and ids ('#x') an element tree needs for a selector to match"""
+        while True:
+            stripped = re.sub(r'\([^()]*\)|\[[^\[\]]*\]', '', selector)
+            if stripped == selector:
+                break
+            selector = stripped
+        tokens = set()
+        for compound in re.split(r'[\s>+~]+', selector):
+            compound = re.sub(r'::?[\w-]+', '', compound)
+            tag = re.match(r'[a-zA-Z][\w-]*', compound)
+            if tag:
+                tokens.add(tag.group().lower())
+            tokens.update(re.findall(r'[.#][\w-]+', compound))
+        return frozenset(tokens)
+
+    @classmethod
+    def page_tokens(cls, html):
+        """The tags, classes and ids in some HTML"""
+        tokens = {tag.lower() for tag in set(cls.TAG_PATTERN.findall(html))}
+        for classes in set(cls.CLASS_PATTERN.findall(html)):
+            tokens.update('.' + name for name in classes.split())
+        tokens.update('#' + name for name in set(cls.ID_PATTERN.findall(html)))
+        return frozenset(tokens)
+
+    def _select(self, rules, tokens):
+        css = []
+        for selectors, rule in rules:
+            if selectors is None and isinstance(rule, tuple):
+                nested = self._select(rule[1], tokens)
+                if nested:
+                    css.append(f'{rule[0]}{{{nested}}}')
+            elif selectors is None or any(selector <= tokens for selector in selectors):
+                css.append(rule)
+        return ''.join(css)
+
+    def for_html(self, html):
+        """The rules that can apply to a page made of the shared parts and some HTML"""
+        tokens = self.base_tokens | self.page_tokens(html)
+        if tokens not in self._matches:
+            self._matches[tokens] = self._select(self.rules, tokens)
+        return self._matches[tokens]
+
+
+def render_file(path, profile=False):
+    """
+    Render a content file in a worker process and return only its HTML, its timings if profiling,
+    and the highlight cache hits and misses of the render
+    """
+    page = ContentFile(path)
+    timings = {} if profile else None
+    cache = RENDERER_POOL.highlight_cache
+    hits, misses = (cache.hits, cache.misses) if cache else (0, 0)
+    page.render(timings)
+    if cache:
+        hits, misses = cache.hits - hits, cache.misses - misses
+    return page.html_content, timings, (hits, misses)
 
 
 def base_template(content, title, meta_tags='', has_mermaid=False, page_url='/'):
@@ -393,56 +1511,96 @@ def base_template(content, title, meta_tags='', has_mermaid=False, page_url='/')
                 mermaid.initialize({ startOnLoad: true });
             </script>'''
 
-    template = TemplateLoader.load('base.html')
-    return template.format(
-        language=LANGUAGE,
+    template = TemplateLoader.fragment('base.html', site_base_template)
+    return template.render(
         title=title,
+        meta_tags=meta_tags,
+        page_url=page_url,
+        content=content,
+        mermaid_script=mermaid_script,
+        stylesheet=stylesheet_links(content + meta_tags + mermaid_script),
+    )
+
+
+def site_base_template():
+    """base.html with everything that is the same on every page filled in"""
+    return TemplateLoader.compiled('base.html').bind(
+        language=LANGUAGE,
         site_title=SITE_TITLE,
         author=AUTHOR,
         description=DESCRIPTION,
         keywords=KEYWORDS,
-        meta_tags=meta_tags,
         base_url=BASE_URL,
-        page_url=page_url,
-        favicon_svg=FAVICON_SVG,
-        favicon_32=FAVICON_32,
+        favicon_svg=asset_url(FAVICON_SVG),
+        favicon_32=asset_url(FAVICON_32),
+        font_links=font_links(),
         header=header_component(),
-        content=content,
         footer=footer_component(),
-        mermaid_script=mermaid_script
     )
 
 
-def header_component():
-    """Generate navigation header"""
-    menu_item_template = TemplateLoader.load('menu-item.html')
-    menu_html = '\n'.join([
-        menu_item_template.format(url=item['url'], name=item['name'])
-        for item in MENU_ITEMS
-    ])
-
-    template = TemplateLoader.load('header.html')
-    return template.format(
-        navbar_title=NAVBAR_TITLE,
-        menu_items=menu_html
+def critical_css():
+    """CriticalCSS of the site stylesheet (as published, with fingerprinted URLs), or None if it can't be inlined"""
+    data = ASSETS.generated.get(asset_url(STYLESHEET_URL).lstrip('/'))
+    if not INLINE_CRITICAL_CSS or data is None:
+        return None
+    critical = CriticalCSS(data.decode('utf-8'), posixpath.dirname(STYLESHEET_URL) + '/')
+    base = TemplateLoader.fragment('base.html', site_base_template)
+    critical.base_tokens = critical.page_tokens(base.render(**{field: '' for field in base.fields}))
+    return critical
+
+
+def stylesheet_links(page_html):
+    """The stylesheet link of a page: the rules it needs inline, then the full stylesheet without blocking"""
+    critical = TemplateLoader.fragment('critical-css', critical_css)
+    if critical is None:
+        return TemplateLoader.compiled('stylesheet.html').render(stylesheet_url=asset_url(STYLESHEET_URL))
+    return TemplateLoader.compiled('critical-css.html').render(
+        critical_css=critical.for_html(page_html), stylesheet_url=asset_url(STYLESHEET_URL)
     )
 
 
-def footer_component():
-    """Generate footer"""
-    year = datetime.now().year
-    since_text = f'{SINCE_YEAR} -' if SINCE_YEAR < year else ''
+def font_links():
+    """Links to the self-hosted font subsets, or to Google Fonts when they can't be generated"""
+    if FontSubsetter.is_available():
+        return TemplateLoader.compiled('fonts.html').render(stylesheet_url=f'/{FONT_STYLESHEET}')
+    return TemplateLoader.load('google-fonts.html')
 
-    template = TemplateLoader.load('footer.html')
-    return template.format(
-        since_text=since_text,
-        year=year
-    )
+
+def header_component():
+    """Generate navigation header (once per build)"""
+    def render():
+        menu_item_template = TemplateLoader.compiled('menu-item.html')
+        menu_html = '\n'.join([
+            menu_item_template.render(url=item['url'], name=item['name'])
+            for item in MENU_ITEMS
+        ])
+
+        return TemplateLoader.compiled('header.html').render(
+            navbar_title=NAVBAR_TITLE,
+            avatar_url=asset_url(AVATAR_URL),
+            menu_items=menu_html
+        )
+    return TemplateLoader.fragment('header.html', render)
+
+
+def footer_component():
+    """Generate footer (once per build)"""
+    def render():
+        year = datetime.now().year
+        since_text = f'{SINCE_YEAR} -' if SINCE_YEAR < year else ''
+
+        return TemplateLoader.compiled('footer.html').render(
+            since_text=since_text,
+            avatar_url=asset_url(AVATAR_URL),
+            year=year
+        )
+    return TemplateLoader.fragment('footer.html', render)
 
 
 def get_invertible_class_attr(image_path):
     """Check if image path ends with -inv and return class attribute string"""
-    if image_path and re.search(r'-inv\.[^/]*$', image_path):
+    if is_invertible_image(image_path):
         return 'class="invertible"'
     return ''
 
@@ -456,38 +1614,81 @@ def get_target_attr_for_url(url):
             return 'target="_blank" rel="noopener noreferrer"'
     return ''
 
+def redirect_template(url, target, entry=None):
+    """Small page redirecting from url to target, with the link preview of a short URL entry"""
+    title = 'Redirecting...'
+    meta_tags = ''
+    if entry is not None:
+        title = entry.get('title', title)
+        meta_tags = TemplateLoader.compiled('short-url.html').render(
+            title=escape(title),
+            description=escape(entry.get('description', f'Redirecting to {target}')),
+            url=escape(f'{BASE_URL}{url}'),
+        )
+        if entry.get('image'):
+            meta_image = TemplateLoader.compiled('meta-image.html').render(image_url=entry['image'], base_url=BASE_URL)
+            meta_tags += '\n' + meta_image
+    return TemplateLoader.compiled('redirect.html').render(
+        language=LANGUAGE,
+        title=escape(title),
+        target_url=escape(target),
+        canonical_url=escape(target if '://' in target else f'{BASE_URL}{target}'),
+        meta_tags=meta_tags,
+    )
+
+
+def redirect_map(server, redirects):
+    """Redirect map for a web server ('netlify' or 'nginx' in REDIRECT_MAPS) of (URL, target, ...) redirects"""
+    if server == 'netlify':
+        return ''.join(f'{url} {target} {REDIRECT_STATUS}\n' for url, target, *_ in redirects)
+
+    def quote(value):
+        return '"' + value.replace('\\', '\\\\').replace('"', '\\"') + '"'
+
+    # Requests may come with or without the trailing slash
+    lines = [
+        f'# Include in an nginx map block, e.g. map $uri $redirect_target {{ include {REDIRECT_MAPS["nginx"]}; }}',
+        f'# then: if ($redirect_target) {{ return {REDIRECT_STATUS} $redirect_target; }}',
+    ]
+    for url, target, *_ in redirects:
+        if url != '/':
+            lines.append(f'{quote(url.rstrip("/"))} {quote(target)};')
+        lines.append(f'{quote(url)} {quote(target)};')
+    return '\n'.join(lines) + '\n'
+
+
 def post_template(page):
     """Generate template for a post page"""
     featured_image = ''
     if page.featured_image:
-        img_template = TemplateLoader.load('featured-image.html')
+        img_template = TemplateLoader.compiled('featured-image.html')
         class_attr = get_invertible_class_attr(page.featured_image)
-        featured_image = img_template.format(src=page.featured_image, class_attr=class_attr)
+        featured_image = img_template.render(src=page.featured_image, class_attr=class_attr)
 
     meta_tags = ''
     if page.featured_image:
-        meta_template = TemplateLoader.load('meta-image.html')
-        meta_tags = meta_template.format(
+        meta_template = TemplateLoader.compiled('meta-image.html')
+        meta_tags = meta_template.render(
             image_url=page.featured_image,
             base_url=BASE_URL
         )
 
     if page.section in ["posts"]:
-        template = TemplateLoader.load('post.html')
+        template = TemplateLoader.compiled('post.html')
     else:
-        template = TemplateLoader.load('page.html')
+        template = TemplateLoader.compiled('page.html')
 
-    desc_template = TemplateLoader.load('description.html')
-    desc_line = desc_template.format(
+    desc_template = TemplateLoader.compiled('description.html')
+    desc_line = desc_template.render(
         description=escape(page.description)
     )
 
-    date_template = TemplateLoader.load('date.html')
-    date_line = date_template.format(
+    date_template = TemplateLoader.compiled('date.html')
+    date_line = date_template.render(
         datetime=page.date.strftime('%Y-%m-%dT%H:%M:%SZ'),
         date_formatted=page.date.strftime('%B %d, %Y'),
     )
-    content_html = template.format(
+    content_html = template.render(
         url=page.url,
         title=escape(page.title),
         date=date_line,
@@ -495,110 +1696,148 @@ def post_template(page):
         featured_image=featured_image,
         html_content=page.html_content
     )
+    content_html = IMAGES.rewrite(content_html)
 
     has_mermaid = '<div class="mermaid">' in page.html_content
     return base_template(content_html, page.title, meta_tags, has_mermaid, page.url)
 
 
-def list_template(section, pages):
-    """Generate template for section list pages"""
-    item_template = TemplateLoader.load('list-item.html')
-    items_html = '\n'.join([
-        item_template.format(
-            featured_image=p.featured_image,
-            description=p.description,
-            date=p.date.strftime('%B %d, %Y'),
-            url=p.get_effective_url(),
-            title=escape(p.title),
-            class_attr=get_invertible_class_attr(p.featured_image),
-            target_attr=get_target_attr_for_url(p.get_effective_url())
+def list_item(page):
+    """A page's entry in listings, rendered once per build and shared by every listing showing it"""
+    def render():
+        url = page.get_effective_url()
+        html = TemplateLoader.compiled('list-item.html').render(
+            featured_image=page.featured_image,
+            description=page.description,
+            date=page.date.strftime('%B %d, %Y'),
+            url=url,
+            title=escape(page.title),
+            class_attr=get_invertible_class_attr(page.featured_image),
+            target_attr=get_target_attr_for_url(url)
         )
-        for p in sorted(pages, key=lambda x: x.date, reverse=True)
-    ])
+        return IMAGES.rewrite(html, THUMBNAIL_IMAGE_SIZES)
+    return TemplateLoader.fragment(('list-item', str(page.path)), render)
+
+
+def list_items(pages):
+    """Listing entries of pages"""
+    return '\n'.join([list_item(p) for p in pages])
+
+
+def paginate(base_url, pages):
+    """
+    Split a listing (sorted newest first) into pages of LIST_PAGE_SIZE items.
 
-    template = TemplateLoader.load('list.html')
-    content_html = template.format(
+    Returns (url, items) for each page: the first one is at base_url, the next ones at
+    base_url/page/2/, base_url/page/3/, ...
+    """
+    size = LIST_PAGE_SIZE or len(pages) or 1
+    chunks = [pages[i:i + size] for i in range(0, len(pages), size)] or [[]]
+    return [(base_url if i == 0 else f'{base_url}page/{i + 1}/', chunk) for i, chunk in enumerate(chunks)]
+
+
+def pagination_html(listing, number):
+    """Links to the newer and older neighbours of page `number` (from 1) of a paginated listing"""
+    if len(listing) == 1:
+        return ''
+    newer = f'<a href="{listing[number - 2][0]}" rel="prev">&larr; Newer</a>' if number > 1 else '<span></span>'
+    older = f'<a href="{listing[number][0]}" rel="next">Older &rarr;</a>' if number < len(listing) else '<span></span>'
+    return TemplateLoader.compiled('pagination.html').render(newer=newer, page=number, older=older)
+
+
+def listing_title(title, number):
+    return f'{title} - Page {number}' if number > 1 else title
+
+
+def list_template(section, pages, page_url=None, number=1, pagination=''):
+    """Generate template for a page of a section list (pages sorted newest first)"""
+    template = TemplateLoader.compiled('list.html')
+    content_html = template.render(
         section_title=section.capitalize(),
-        items=items_html
+        items=list_items(pages),
+        pagination=pagination
     )
 
-    return base_template(content_html, section.capitalize(), page_url=f'/{section}/')
+    return base_template(
+        content_html, listing_title(section.capitalize(), number), page_url=page_url or f'/{section}/'
+    )
 
 
 def home_template(recent_posts, recent_talks):
     """Generate homepage template"""
-    item_template = TemplateLoader.load('list-item.html')
-    recent_posts_html = '\n'.join([
-        item_template.format(
-            featured_image=p.featured_image,
-            description=p.description,
-            date=p.date.strftime('%B %d, %Y'),
-            url=p.get_effective_url(),
-            title=escape(p.title),
-            class_attr=get_invertible_class_attr(p.featured_image),
-            target_attr=get_target_attr_for_url(p.get_effective_url())
-        )
-        for p in recent_posts[:4]
-    ])
-    recent_talks_html = '\n'.join([
-        item_template.format(
-            featured_image=p.featured_image,
-            description=p.description,
-            date=p.date.strftime('%B %d, %Y'),
-            url=p.get_effective_url(),
-            title=escape(p.title),
-            class_attr=get_invertible_class_attr(p.featured_image),
-            target_attr=get_target_attr_for_url(p.get_effective_url())
-        )
-        for p in recent_talks[:4]
-    ])
-    template = TemplateLoader.load('home.html')
-    content_html = template.format(
-        avatar_url=AVATAR_URL,
-        recent_posts=recent_posts_html,
-        recent_talks=recent_talks_html
+    template = TemplateLoader.compiled('home.html')
+    content_html = template.render(
+        avatar_url=asset_url(AVATAR_URL),
+        recent_posts=list_items(recent_posts[:HOME_ITEMS]),
+        recent_talks=list_items(recent_talks[:HOME_ITEMS])
     )
     return base_template(content_html, "Home")
 
 
-def series_template(series_name, pages):
-    """Generate template for series pages"""
-    item_template = TemplateLoader.load('list-item.html')
-    items_html = '\n'.join([
-        item_template.format(
-            featured_image=p.featured_image,
-            description=p.description,
-            date=p.date.strftime('%B %d, %Y'),
-            url=p.get_effective_url(),
-            title=escape(p.title),
-            class_attr=get_invertible_class_attr(p.featured_image),
-            target_attr=get_target_attr_for_url(p.get_effective_url())
-        )
-        for p in sorted(pages, key=lambda x: x.date, reverse=True)
-    ])
-
-    template = TemplateLoader.load('series.html')
-    content_html = template.format(
+def series_template(series_name, pages, page_url=None, number=1, pagination=''):
+    """Generate template for a page of a series (pages sorted newest first)"""
+    template = TemplateLoader.compiled('series.html')
+    content_html = template.render(
         series_name=series_name,
-        items=items_html
+        items=list_items(pages),
+        pagination=pagination
     )
 
     slug = series_name.lower().replace(' ', '-')
-    return base_template(content_html, f'Series: {series_name}', page_url=f'/series/{slug}/')
+    return base_template(
+        content_html, listing_title(f'Series: {series_name}', number), page_url=page_url or f'/series/{slug}/'
+    )
 
 
-class RSSGenerator:
-    """Generate RSS feeds"""
+def feed_outputs(section_name=''):
+    """Output paths of the feeds of a section (or of the main feed), by format"""
+    prefix = f'{section_name}/' if section_name else ''
+    return {fmt: prefix + name for fmt, name in FEED_FORMATS.items()}
+
+
+def html_text(html_content, exclude_code=True):
+    """The text of some HTML, optionally leaving out code blocks"""
+    if exclude_code:
+        html_content = re.sub(r'<pre\b.*?</pre>', ' ', html_content, flags=re.DOTALL)
+    return unescape(re.sub(r'<[^>]+>', ' ', html_content))
+
+
+def html_excerpt(html_content, length=FEED_EXCERPT_LENGTH):
+    """The plain text at the start of some HTML (without code blocks), cut at a word boundary"""
+    text = ' '.join(html_text(html_content).split())
+    if len(text) <= length:
+        return text
+    return text[:length].rsplit(' ', 1)[0] + '…'
 
-    @staticmethod
-    def generate(pages, output_path, section_name=''):
-        """Generate an RSS feed"""
-        rss = Element('rss', version='2.0')
-        rss.set('xmlns:atom', 'http://www.w3.org/2005/Atom')
 
-        channel = SubElement(rss, 'channel')
+def xml_element(tag, text):
+    """An XML element with escaped text, serialized like ElementTree does"""
+    if not text:
+        return f'<{tag} />'
+    return f'<{tag}>{escape(str(text), quote=False)}</{tag}>'
 
-        # Channel metadata
+
+class FeedGenerator:
+    """
+    Generate a feed as RSS, Atom and JSON Feed in a single pass over its items.
+
+    The three formats are streamed to their files: each item is written to all of them as soon
+    as it's produced, without building element trees or keeping earlier items in memory. Items
+    are the FEED_ITEMS most recent pages; each embeds the page's full HTML, or a plain-text
+    excerpt if FEED_EXCERPTS is set.
+    """
+    RSS_DATE = '%a, %d %b %Y %H:%M:%S +0000'
+    ISO_DATE = '%Y-%m-%dT%H:%M:%SZ'
+    # Atom requires <updated>: a feed without items gets a fixed date, so it doesn't change between builds
+    EMPTY_DATE = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+    @classmethod
+    def write(cls, pages, files, section_name=''):
+        """Write the feeds of pages (sorted newest first) to files, binary files opened for each format"""
+        def emit(fmt, text):
+            files[fmt].write(text.encode('utf-8'))
+
+        outputs = feed_outputs(section_name)
         if section_name:
             title_text = f'{section_name.capitalize()} on {SITE_TITLE}'
             desc_text = f'Recent content in {section_name} on {SITE_TITLE}'
@@ -607,69 +1846,738 @@ class RSSGenerator:
             title_text = SITE_TITLE
             desc_text = f'Recent content on {SITE_TITLE}'
             link_text = BASE_URL + '/'
-
-        SubElement(channel, 'title').text = title_text
-        SubElement(channel, 'link').text = link_text
-        SubElement(channel, 'description').text = desc_text
-        SubElement(channel, 'generator').text = 'Custom Script'
-        SubElement(channel, 'language').text = LANGUAGE
-
-        if pages:
-            latest_date = max(p.date for p in pages)
-            SubElement(channel, 'lastBuildDate').text = latest_date.strftime('%a, %d %b %Y %H:%M:%S +0000')
-
-        # Add items
-        for page in sorted(pages, key=lambda x: x.date, reverse=True)[:20]:
-            item = SubElement(channel, 'item')
-            SubElement(item, 'title').text = page.title
+        latest_date = pages[0].date if pages else cls.EMPTY_DATE
+
+        emit('rss', '<?xml version="1.0" encoding="utf-8" standalone="yes"?>\n'
+             '<rss version="2.0" xmlns:atom="http://www.w3.org/2005/Atom"><channel>'
+             + xml_element('title', title_text) + xml_element('link', link_text)
+             + xml_element('description', desc_text) + xml_element('generator', 'Custom Script')
+             + xml_element('language', LANGUAGE)
+             + xml_element('lastBuildDate', latest_date.strftime(cls.RSS_DATE)))
+        emit('atom', '<?xml version="1.0" encoding="utf-8"?>\n'
+             '<feed xmlns="http://www.w3.org/2005/Atom">'
+             + xml_element('title', title_text) + xml_element('subtitle', desc_text)
+             + f'<link href="{escape(link_text)}" />'
+             + f'<link rel="self" href="{escape(BASE_URL + "/" + outputs["atom"])}" />'
+             + xml_element('id', link_text) + xml_element('generator', 'Custom Script')
+             + f'<author>{xml_element("name", AUTHOR)}</author>'
+             + xml_element('updated', latest_date.strftime(cls.ISO_DATE)))
+        # JSON Feed is written as an object whose members are each serialized by json, with the
+        # items array left open for the items to be appended one by one
+        header = {
+            'version': 'https://jsonfeed.org/version/1.1',
+            'title': title_text,
+            'home_page_url': link_text,
+            'feed_url': BASE_URL + '/' + outputs['json'],
+            'description': desc_text,
+            'language': LANGUAGE,
+            'authors': [{'name': AUTHOR}],
+        }
+        emit('json', '{' + ''.join(f'{cls.json_value(key)}:{cls.json_value(value)},' for key, value in header.items())
+             + '"items":[')
+
+        for i, page in enumerate(pages[:FEED_ITEMS]):
             effective_url = page.get_effective_url()
             # For external links, use them directly; for internal, prepend BASE_URL
             link_url = effective_url if page.external_link else BASE_URL + effective_url
-            SubElement(item, 'link').text = link_url
-            SubElement(item, 'pubDate').text = page.date.strftime('%a, %d %b %Y %H:%M:%S +0000')
-            SubElement(item, 'guid').text = link_url
-            SubElement(item, 'description').text = page.html_content
+            iso_date = page.date.strftime(cls.ISO_DATE)
+            if FEED_EXCERPTS:
+                excerpt = html_excerpt(page.html_content)
+                atom_content = xml_element('summary', excerpt)
+                item = {'content_text': excerpt}
+            else:
+                atom_content = f'<content type="html">{escape(page.html_content, quote=False)}</content>'
+                item = {'content_html': page.html_content}
+
+            emit('rss',
+                 '<item>' + xml_element('title', page.title) + xml_element('link', link_url)
+                 + xml_element('pubDate', page.date.strftime(cls.RSS_DATE)) + xml_element('guid', link_url)
+                 + xml_element('description', excerpt if FEED_EXCERPTS else page.html_content) + '</item>')
+            emit('atom',
+                 '<entry>' + xml_element('title', page.title) + f'<link href="{escape(link_url)}" />'
+                 + xml_element('id', link_url) + xml_element('published', iso_date)
+                 + xml_element('updated', iso_date) + atom_content + '</entry>')
+            emit('json', (',' if i else '') + cls.json_value(
+                {'id': link_url, 'url': link_url, 'title': str(page.title), **item, 'date_published': iso_date}
+            ))
+
+        emit('rss', '</channel></rss>')
+        emit('atom', '</feed>')
+        emit('json', ']}')
 
-        # Write to file
-        output_path.parent.mkdir(parents=True, exist_ok=True)
-        with open(output_path, 'wb') as f:
-            f.write(b'<?xml version="1.0" encoding="utf-8" standalone="yes"?>\n')
-            f.write(tostring(rss, encoding='utf-8'))
+    @staticmethod
+    def json_value(value):
+        """Serialize a value of the JSON Feed"""
+        return json.dumps(value, ensure_ascii=False, separators=(',', ':'))
 
 
 class SitemapGenerator:
-    """Generate sitemap.xml"""
+    """
+    Generate the sitemap, split over several files when it's too big for one.
+
+    Entries are written as text one by one. Each file holds at most SITEMAP_MAX_URLS URLs and
+    SITEMAP_MAX_BYTES bytes. If everything fits in one file, that's sitemap.xml; otherwise
+    sitemap.xml is a sitemap index pointing to sitemap-1.xml, sitemap-2.xml, ...
+    """
+    HEADER = '<?xml version="1.0" encoding="utf-8" standalone="yes"?>\n'
+    XMLNS = 'http://www.sitemaps.org/schemas/sitemap/0.9'
+    URLSET_START = f'<urlset xmlns="{XMLNS}">'
+    URLSET_END = '</urlset>'
+
+    @staticmethod
+    def url_entry(url, lastmod):
+        return f'<url><loc>{escape(BASE_URL + url, quote=False)}</loc><lastmod>{lastmod}</lastmod></url>'
+
+    @classmethod
+    def split(cls, urls):
+        """Split URLs into the lists written to each sitemap file (lastmods have a fixed length)"""
+        overhead = len(cls.HEADER) + len(cls.URLSET_START) + len(cls.URLSET_END)
+        shards, current, size = [], [], overhead
+        for url in urls:
+            entry_size = len(cls.url_entry(url, '0000-00-00').encode('utf-8'))
+            if current and (len(current) >= SITEMAP_MAX_URLS or size + entry_size > SITEMAP_MAX_BYTES):
+                shards.append(current)
+                current, size = [], overhead
+            current.append(url)
+            size += entry_size
+        shards.append(current)
+        return shards
+
+    @staticmethod
+    def outputs(shard_count):
+        """Files written for a sitemap split in shard_count parts"""
+        if shard_count == 1:
+            return ['sitemap.xml']
+        return ['sitemap.xml'] + [f'sitemap-{i}.xml' for i in range(1, shard_count + 1)]
+
+    @classmethod
+    def generate(cls, entries):
+        """Generate the sitemap of (URL, lastmod) entries, yielding (output, bytes) of each file"""
+        lastmods = dict(entries)
+        shards = cls.split([url for url, _ in entries])
+        outputs = cls.outputs(len(shards))
+        for output, urls in zip(outputs[-len(shards):], shards):
+            chunks = [cls.HEADER, cls.URLSET_START]
+            chunks.extend(cls.url_entry(url, lastmods[url]) for url in urls)
+            chunks.append(cls.URLSET_END)
+            yield output, ''.join(chunks).encode('utf-8')
+
+        if len(shards) > 1:
+            chunks = [cls.HEADER, f'<sitemapindex xmlns="{cls.XMLNS}">']
+            for output, urls in zip(outputs[1:], shards):
+                lastmod = max(lastmods[url] for url in urls)
+                chunks.append(
+                    f'<sitemap><loc>{escape(BASE_URL, quote=False)}/{output}</loc><lastmod>{lastmod}</lastmod></sitemap>'
+                )
+            chunks.append('</sitemapindex>')
+            yield 'sitemap.xml', ''.join(chunks).encode('utf-8')
+
+
+def search_terms(text):
+    """The terms of some text, as the search index and static/js/search.js split it"""
+    return [
+        term for term in re.findall(r'\w+', text.lower())
+        if len(term) >= SEARCH_MIN_TERM_LENGTH and term not in SEARCH_STOPWORDS
+    ]
+
+
+def search_fingerprint():
+    """Everything besides the page itself that its search terms depend on"""
+    return json.dumps([
+        SEARCH_INDEX_VERSION,
+        SEARCH_MIN_TERM_LENGTH,
+        SEARCH_EXCLUDE_CODE,
+        SEARCH_TITLE_WEIGHT,
+        sorted(SEARCH_STOPWORDS),
+        render_fingerprint(),
+    ])
+
+
+class SearchIndex:
+    """
+    Inverted index of the site's pages for client-side search (static/js/search.js).
+
+    The term frequencies of each page are cached under a key derived from its source, so only
+    pages that changed are tokenized again. Postings list the ids of the pages containing a term
+    in increasing order, delta-encoded, each followed by the term's frequency in the page. Terms
+    are sharded by their first SEARCH_PREFIX_LENGTH characters, so a query only loads the shards
+    of its own terms. Page ids are kept from one build to the next (see assign_ids()), so adding,
+    removing or drafting a page only changes the shards of its own terms. The files written to
+    SEARCH_DIR are:
+
+    - index.json: the settings the client needs and the list of shards
+    - docs.json: [url, title, date (empty if not shown), description] of each page, by id (null
+      for the ids of removed pages)
+    - <shard>.json: the postings of every term in the shard
+    """
+
+    def __init__(self, cache=None):
+        self.cache = cache
+        self.fingerprint = search_fingerprint()
+        # Term frequencies of pages tokenized by this build, by key
+        self.tokens = {}
+        self.tokenized = 0
+
+    def has(self, key):
+        return key in self.tokens or (self.cache is not None and self.cache.get(key) is not None)
+
+    def add(self, key, page):
+        """Tokenize a rendered page, unless it's in the cache already"""
+        if not self.has(key):
+            self._tokenize(key, page)
+
+    def get(self, key, page):
+        """Term frequencies of a rendered page: from this build, else the cache, else tokenized again"""
+        if key not in self.tokens:
+            cached = self.cache.get(key) if self.cache is not None else None
+            if cached is None:
+                return self._tokenize(key, page)
+            self.tokens[key] = json.loads(cached)
+        return self.tokens[key]
+
+    def _tokenize(self, key, page):
+        counts = Counter(search_terms(html_text(page.html_content, SEARCH_EXCLUDE_CODE)))
+        for term in search_terms(str(page.title)):
+            counts[term] += SEARCH_TITLE_WEIGHT
+        self.tokens[key] = dict(counts)
+        if self.cache is not None:
+            self.cache.set(key, json.dumps(self.tokens[key], ensure_ascii=False).encode('utf-8'))
+        self.tokenized += 1
+        return self.tokens[key]
 
     @staticmethod
-    def generate(pages, output_path):
-        """Generate sitemap"""
-        urlset = Element('urlset', xmlns='http://www.sitemaps.org/schemas/sitemap/0.9')
+    def shard_name(term):
+        """File name (without extension) of the shard holding a term, as computed by search.js"""
+        return ''.join(c if c.isascii() and c.isalnum() else f'_{ord(c):x}' for c in term[:SEARCH_PREFIX_LENGTH])
 
-        # Add homepage
-        url = SubElement(urlset, 'url')
-        SubElement(url, 'loc').text = BASE_URL + '/'
-        SubElement(url, 'lastmod').text = datetime.now().strftime('%Y-%m-%d')
+    @staticmethod
+    def assign_ids(ids, docs):
+        """
+        Return the id of each doc (page), given the ids of the previous build by URL.
+
+        ids is updated in place. Pages keep their id, new pages get the next ones in the order of
+        docs, and the ids of removed pages stay reserved in case they come back (e.g. a page
+        drafted and published again). When more than SEARCH_MAX_UNUSED_IDS of the ids are unused,
+        the pages are numbered again from 0, in the order of their previous ids.
+        """
+        urls = {page.url for page in docs}
+        if len(ids.keys() - urls) > SEARCH_MAX_UNUSED_IDS * len(ids):
+            kept = sorted(urls & ids.keys(), key=ids.get)
+            ids.clear()
+            ids.update((url, doc_id) for doc_id, url in enumerate(kept))
+        next_id = max(ids.values(), default=-1) + 1
+        for page in docs:
+            if page.url not in ids:
+                ids[page.url] = next_id
+                next_id += 1
+        return [ids[page.url] for page in docs]
+
+    def build(self, docs, keys, ids):
+        """Build the index of docs (pages) with the given ids, tokens stored under keys. Returns {output: bytes}."""
+        docs = sorted(zip(ids, docs, keys), key=lambda doc: doc[0])
+        postings = defaultdict(list)
+        for doc_id, page, key in docs:
+            for term, count in self.get(key, page).items():
+                postings[term].append((doc_id, count))
+
+        shards = defaultdict(dict)
+        for term in sorted(postings):
+            encoded = []
+            previous = 0
+            for doc_id, count in postings[term]:
+                encoded += [doc_id - previous, count]
+                previous = doc_id
+            shards[self.shard_name(term)][term] = encoded
+
+        def dump(data):
+            return json.dumps(data, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+        outputs = {
+            f'{SEARCH_DIR}/{name}.json': dump(terms) for name, terms in sorted(shards.items())
+        }
+        entries = [None] * (docs[-1][0] + 1 if docs else 0)
+        for doc_id, p, _ in docs:
+            entries[doc_id] = [
+                p.url, str(p.title), p.date.strftime('%Y-%m-%d') if p.show_date and 'date' in p.front_matter else '',
+                str(p.description),
+            ]
+        outputs[f'{SEARCH_DIR}/docs.json'] = dump(entries)
+        outputs[f'{SEARCH_DIR}/index.json'] = dump({
+            'version': SEARCH_INDEX_VERSION,
+            'prefix_length': SEARCH_PREFIX_LENGTH,
+            'min_term_length': SEARCH_MIN_TERM_LENGTH,
+            'stopwords': sorted(SEARCH_STOPWORDS),
+            'docs': len(docs),
+            'shards': sorted(shards),
+        })
+        return outputs
+
+
+class DependencyGraph:
+    """
+    Which build inputs each output depends on.
+
+    Inputs are source paths (content files, templates, short-urls.yaml), outputs are paths
+    relative to public/. The graph answers both "what must be regenerated when this file
+    changes" and "why was this output regenerated".
+    """
+
+    def __init__(self):
+        self._inputs_of = defaultdict(set)
+        self._outputs_of = defaultdict(set)
+
+    def add(self, output, *inputs):
+        """Declare an output and the inputs it depends on"""
+        self._inputs_of[output].update(inputs)
+        for source in inputs:
+            self._outputs_of[source].add(output)
 
-        # Add all pages (only internal pages, not external links)
-        for page in pages:
-            if not page.external_link:
-                url = SubElement(urlset, 'url')
-                SubElement(url, 'loc').text = BASE_URL + page.url
-                SubElement(url, 'lastmod').text = page.date.strftime('%Y-%m-%d')
+    def outputs_affected_by(self, path):
+        """Sorted list of the outputs that depend on the given input"""
+        return sorted(self._outputs_of.get(str(path), ()))
 
-        # Write to file
-        with open(output_path, 'wb') as f:
-            f.write(b'<?xml version="1.0" encoding="utf-8" standalone="yes"?>\n')
-            f.write(tostring(urlset, encoding='utf-8'))
+    def inputs_of(self, output):
+        """Sorted list of the inputs the given output depends on"""
+        return sorted(self._inputs_of.get(output, ()))
+
+    def inputs(self):
+        """Every input with at least one output"""
+        return set(self._outputs_of)
+
+    def outputs(self):
+        """Every output in the graph"""
+        return set(self._inputs_of)
+
+    def to_dict(self):
+        """JSON-serializable form: each output mapped to its sorted inputs"""
+        return {output: sorted(inputs) for output, inputs in sorted(self._inputs_of.items())}
+
+    @classmethod
+    def from_dict(cls, data):
+        graph = cls()
+        for output, inputs in data.items():
+            graph.add(output, *inputs)
+        return graph
+
+    def dump(self, path):
+        """Write the graph to a JSON file"""
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.to_dict(), f, indent=1)
+
+
+class AssetSync:
+    """
+    Mirror asset files into public/, copying only the ones that changed.
+
+    A destination is up to date when it has the same size and mtime as its source (copies keep
+    the source mtime), or is the same file (hardlinks). When only the mtimes differ, the contents
+    are compared by hash. Files are copied, or hardlinked/reflinked if link_mode asks for it and
+    the filesystem supports it. Hardlinked outputs share their data with the sources, so they
+    must never be edited in place.
+    """
+    LINK_MODES = ('copy', 'hardlink', 'reflink')
+
+    def __init__(self, link_mode='copy'):
+        self.link_mode = link_mode
+        self.copied = 0
+        self.unchanged = 0
+
+    def is_up_to_date(self, src, dest):
+        """True if dest already has the contents of src"""
+        try:
+            src_stat = os.stat(src)
+            dest_stat = os.stat(dest)
+        except FileNotFoundError:
+            return False
+        if (src_stat.st_dev, src_stat.st_ino) == (dest_stat.st_dev, dest_stat.st_ino):
+            return True
+        if src_stat.st_size != dest_stat.st_size:
+            return False
+        if src_stat.st_mtime_ns == dest_stat.st_mtime_ns:
+            return True
+        if hash_file(src) != hash_file(dest):
+            return False
+        # Same contents: align the mtime so the next sync doesn't need to hash again
+        shutil.copystat(src, dest)
+        return True
+
+    def sync(self, src, dest):
+        """Bring dest up to date with src. Returns True if anything was copied."""
+        dest = Path(dest)
+        if self.is_up_to_date(src, dest):
+            self.unchanged += 1
+            return False
+        dest.parent.mkdir(parents=True, exist_ok=True)
+        # Replace atomically, never writing through an existing file (it may be a hardlink)
+        tmp_path = dest.with_name(f'.{dest.name}.{os.getpid()}.tmp')
+        if not self._link(src, tmp_path):
+            shutil.copy2(src, tmp_path)
+        os.replace(tmp_path, dest)
+        self.copied += 1
+        return True
+
+    def _link(self, src, tmp_path):
+        """Hardlink or reflink src to tmp_path if configured. False if a plain copy is needed."""
+        try:
+            if self.link_mode == 'hardlink':
+                os.link(src, tmp_path)
+                return True
+            if self.link_mode == 'reflink' and fcntl is not None:
+                with open(src, 'rb') as s, open(tmp_path, 'wb') as d:
+                    fcntl.ioctl(d.fileno(), FICLONE, s.fileno())
+                shutil.copystat(src, tmp_path)
+                return True
+        except OSError:
+            # Different filesystems, or no reflink support: fall back to copying
+            if tmp_path.exists():
+                tmp_path.unlink()
+        return False
+
+
+def compress_file(path, use_brotli):
+    """
+    Compress a file at maximum level (runs in worker threads).
+
+    Returns the file's hash and size, its gzip bytes, and its brotli bytes (None without brotli).
+    """
+    data = Path(path).read_bytes()
+    # mtime=0 keeps the output reproducible, so unchanged files produce identical sidecars
+    gz = gzip.compress(data, compresslevel=9, mtime=0)
+    br = brotli.compress(data, quality=11) if use_brotli else None
+    return hash_bytes(data), len(data), gz, br
+
+
+class Precompressor:
+    """
+    Write .gz (and .br, if the brotli module is available) sidecars next to text outputs.
+
+    Web servers can then serve them as they are instead of compressing on every request.
+    Sidecars are only kept when they are at least COMPRESSION_MIN_SAVING smaller than the
+    original. Files whose hash didn't change since the last build keep their sidecars untouched.
+    """
+
+    def __init__(self, index_path=None):
+        self.index_path = Path(index_path) if index_path else CACHE_DIR / 'compress.json'
+        self.use_brotli = brotli is not None
+
+    def _load_index(self):
+        try:
+            with open(self.index_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def run(self, builder, outputs):
+        """Compress the given outputs of a build. Returns (compressed count, unchanged count)."""
+        index = self._load_index()
+        new_index = {}
+        todo = []
+        for output in sorted(outputs):
+            if output.rsplit('.', 1)[-1] not in COMPRESSIBLE_EXTENSIONS:
+                continue
+            path = builder.output_dir / output
+            entry = index.get(output)
+            if entry and hash_file(path) == entry[0] and all((builder.output_dir / s).exists() for s in entry[1]):
+                builder.extra_outputs.update(entry[1])
+                new_index[output] = entry
+            else:
+                todo.append(output)
+
+        with ThreadPoolExecutor() as executor:
+            results = executor.map(
+                lambda output: compress_file(builder.output_dir / output, self.use_brotli), todo
+            )
+            for output, (digest, size, gz, br) in zip(todo, results):
+                sidecars = []
+                for suffix, data in (('.gz', gz), ('.br', br)):
+                    if data is not None and len(data) <= size * (1 - COMPRESSION_MIN_SAVING):
+                        builder.write_output(output + suffix, data)
+                        sidecars.append(output + suffix)
+                new_index[output] = [digest, sidecars]
+
+        self.index_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.index_path, 'w', encoding='utf-8') as f:
+            json.dump(new_index, f)
+        return len(todo), len(new_index) - len(todo)
+
+
+def cpu_time():
+    """CPU time used by this process and its finished children (e.g. render workers)"""
+    t = os.times()
+    return t.user + t.system + t.children_user + t.children_system
+
+
+class BuildProfiler:
+    """
+    Timings of a build: wall and CPU time of every phase and a breakdown of each page render.
+
+    Does nothing unless enabled. The report is written as JSON, plus a trace-event file that can
+    be opened in chrome://tracing or https://ui.perfetto.dev.
+    """
+
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self.started = time.perf_counter()
+        self.phases = []
+        self.renders = []
+        self.bytes_written = 0
+
+    @contextmanager
+    def phase(self, name):
+        """Time the enclosed block as a build phase"""
+        if not self.enabled:
+            yield
+            return
+        start, cpu_start = time.perf_counter(), cpu_time()
+        try:
+            yield
+        finally:
+            self.phases.append({
+                'name': name,
+                'start': start - self.started,
+                'wall': time.perf_counter() - start,
+                'cpu': cpu_time() - cpu_start,
+            })
+
+    def record_render(self, page, timings):
+        """Record the timings of a page render, as filled in by ContentFile.render()"""
+        if self.enabled:
+            self.renders.append({'page': str(page.path), **timings, 'start': timings['start'] - self.started})
+
+    def report(self):
+        """The profile as a JSON-serializable dict"""
+        totals = defaultdict(lambda: {'calls': 0, 'wall': 0.0, 'cpu': 0.0})
+        for phase in self.phases:
+            total = totals[phase['name']]
+            total['calls'] += 1
+            total['wall'] += phase['wall']
+            total['cpu'] += phase['cpu']
+        slowest = sorted(self.renders, key=lambda r: r['total'], reverse=True)[:10]
+        return {
+            'wall': time.perf_counter() - self.started,
+            'cpu': cpu_time(),
+            'bytes_written': self.bytes_written,
+            'phases': dict(totals),
+            'renders': self.renders,
+            'slowest_pages': slowest,
+        }
+
+    def trace_events(self):
+        """The profile in Chrome trace-event format"""
+        events = [
+            {
+                'name': phase['name'], 'cat': 'phase', 'ph': 'X', 'pid': os.getpid(), 'tid': 0,
+                'ts': phase['start'] * 1e6, 'dur': phase['wall'] * 1e6, 'args': {'cpu': phase['cpu']},
+            }
+            for phase in self.phases
+        ]
+        for render in self.renders:
+            steps = {k: v for k, v in render.items() if k not in ('page', 'start', 'pid', 'total')}
+            events.append({
+                'name': render['page'], 'cat': 'render', 'ph': 'X', 'pid': os.getpid(), 'tid': render['pid'],
+                'ts': render['start'] * 1e6, 'dur': render['total'] * 1e6, 'args': steps,
+            })
+        return {'traceEvents': events, 'displayTimeUnit': 'ms'}
+
+    def write(self, directory):
+        """Write profile.json and trace.json to a directory and print a summary"""
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        report = self.report()
+        with open(directory / 'profile.json', 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=1)
+        with open(directory / 'trace.json', 'w', encoding='utf-8') as f:
+            json.dump(self.trace_events(), f)
+
+        print(f'\nBuild profile: {report["wall"]:.3f}s wall, {report["cpu"]:.3f}s CPU, {report["bytes_written"]} bytes written')
+        for name, total in sorted(report['phases'].items(), key=lambda item: item[1]['wall'], reverse=True):
+            print(f'  {name:<28} {total["wall"]:8.3f}s wall {total["cpu"]:8.3f}s CPU  ({total["calls"]} calls)')
+        if report['slowest_pages']:
+            print('Slowest pages:')
+            for render in report['slowest_pages']:
+                steps = ', '.join(
+                    f'{k} {v * 1000:.1f}ms' for k, v in render.items() if k in ('preprocess', 'markdown', 'postprocess')
+                )
+                print(f'  {render["total"] * 1000:8.1f}ms  {render["page"]} ({steps})')
+        print(f'Profile written to {directory}/profile.json and {directory}/trace.json')
+
+
+def build_phase(method):
+    """Record a Builder method as a build phase in the profile"""
+    @wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self.profiler.phase(method.__name__):
+            return method(self, *args, **kwargs)
+    return wrapper
+
+
+class BuildManifest:
+    """
+    Record of the last build: hashes of its inputs and the dependency graph of its outputs.
+
+    The next build compares the input hashes to find what changed, and uses both the old and the
+    new graph to find the outputs to regenerate (the old one covers outputs a page no longer
+    contributes to, e.g. the series page of a series it was removed from).
+
+    It also records, for every page in the sitemap, the hash of the content it shows and the
+    date that hash last changed, which becomes the page's lastmod, and the id of every page in
+    the search index, so that ids don't change between builds.
+    """
+    VERSION = 2
+
+    def __init__(self, path=None):
+        self.path = Path(path) if path else CACHE_DIR / 'manifest.json'
+        self.config = ''
+        self.inputs = {}
+        self.graph = DependencyGraph()
+        # Output -> [content signature, date it last changed]
+        self.lastmod = {}
+        # HTML output -> the characters its text uses besides FONT_BASE_CHARSET, when fonts are subset
+        self.charsets = {}
+        # Page URL -> its id in the search index
+        self.search_ids = {}
+
+    @classmethod
+    def load(cls, path=None):
+        """Load the manifest from disk. Returns None if there is no usable manifest."""
+        manifest = cls(path)
+        if not manifest.path.exists():
+            return None
+        try:
+            with open(manifest.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if data.get('version') != cls.VERSION:
+            return None
+        manifest.config = data['config']
+        manifest.inputs = data['inputs']
+        manifest.graph = DependencyGraph.from_dict(data['graph'])
+        manifest.lastmod = data.get('lastmod', {})
+        manifest.charsets = data.get('charsets', {})
+        manifest.search_ids = data.get('search_ids', {})
+        return manifest
+
+    def save(self):
+        """Write the manifest to disk"""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        data = {
+            'version': self.VERSION,
+            'config': self.config,
+            'inputs': self.inputs,
+            'graph': self.graph.to_dict(),
+            'lastmod': self.lastmod,
+            'charsets': self.charsets,
+            'search_ids': self.search_ids,
+        }
+        with open(self.path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, indent=1, sort_keys=True)
+
+
+class PageIndex:
+    """
+    Views of the collected pages shared by the generators, computed once after collection.
+
+    The per-section, per-series and feed lists are sorted newest first (pages with the same date
+    keep their collection order); `published` and `internal` keep the collection order.
+    """
+
+    def __init__(self, pages):
+        self.pages = pages
+        self.published = [p for p in pages if not p.is_draft]
+        # Pages with a page of their own (external links only appear in listings and feeds)
+        self.internal = [p for p in self.published if not p.external_link]
+        self.by_date = sorted(self.published, key=attrgetter('date'), reverse=True)
+        self.by_section = defaultdict(list)
+        self.by_series = defaultdict(list)
+        for page in self.by_date:
+            if page.section:
+                self.by_section[page.section].append(page)
+            for series in page.series:
+                self.by_series[series].append(page)
+        self.feed = [p for p in self.by_date if p.section in FEED_SECTIONS]
+
+    @property
+    def draft_count(self):
+        return len(self.pages) - len(self.published)
+
+    @property
+    def external_link_count(self):
+        return len(self.published) - len(self.internal)
+
+    def recent(self, section, count):
+        """The `count` most recent pages of a section"""
+        return self.by_section.get(section, [])[:count]
+
+    def feeds(self):
+        """(section name, pages) of every feed: the main one (with no section name), then one per section"""
+        yield '', self.feed
+        for section, pages in self.by_section.items():
+            yield section, pages
+
+
+def is_content_input(source):
+    """True for inputs that are content (pages, their images, short URLs), not templates or static assets"""
+    return not source.startswith(('templates/', 'static/'))
+
+
+def series_slug(series_name):
+    """URL slug of a series page"""
+    return series_name.lower().replace(' ', '-')
+
+
+def output_path_for_url(url):
+    """Output file (relative to public/) for a page URL like '/posts/slug/'"""
+    return posixpath.join(url.strip('/'), 'index.html') if url.strip('/') else 'index.html'
 
 
 class Builder:
     """Main builder class that orchestrates the build process"""
 
-    def __init__(self):
+    def __init__(self, incremental=False, jobs=1, use_cache=True, explain=False, link_mode='copy', clean=False,
+                 swap_mode='rename', precompress=True, profile=False, alias_mode='redirect', require_fonts=False):
         self.pages = []
         self.public_dir = Path('public')
-
+        # Where files are written: public/ itself, or a staging directory swapped in at the end
+        self.output_dir = self.public_dir
+        # How a staged build replaces public/ ('rename' or 'symlink'), or None to build in place
+        self.swap_mode = swap_mode
+        self.changed_outputs = 0
+        # Pages written by render_content() during the current build
+        self.published_pages = 0
+        self.precompress = precompress
+        self.profiler = BuildProfiler(profile)
+        self.incremental = incremental
+        self.explain = explain
+        self.force_clean = clean
+        # How page aliases are published, one of ALIAS_MODES
+        self.alias_mode = alias_mode
+        # Fail instead of falling back to Google Fonts when fonts can't be subset (for CI)
+        self.require_fonts = require_fonts
+        self.jobs = jobs
+        self.render_cache = DiskCache(CACHE_DIR / 'render', RENDER_CACHE_MAX_BYTES) if use_cache else None
+        configure_highlight_cache(CACHE_DIR / 'highlight' if use_cache else None)
+        self.search = SearchIndex(DiskCache(CACHE_DIR / 'search', SEARCH_CACHE_MAX_BYTES) if use_cache else None)
+        self.manifest = None
+        # Outputs (relative to public/) that must be regenerated. None means everything.
+        self.dirty = None
+        self.written = set()
+        # Other files that belong in public/, e.g. kept as they were by post-build stages
+        self.extra_outputs = set()
+        self.graph = DependencyGraph()
+        self.index = PageIndex([])
+        # Inputs that aren't files, e.g. which items are on each page of a listing: name -> hash
+        self.virtual_inputs = {}
+        # (URL, output) of the pages listed in the sitemap
+        self.sitemap_pages = []
+        # Redirect output -> (URL, target URL, origin, short-urls.yaml entry or None)
+        self.redirects = {}
+        # Whether fonts are subset and self-hosted (see FontSubsetter)
+        self.subset_fonts = False
+        self.assets = {}
+        self.asset_sync = AssetSync(link_mode)
+
+    @build_phase
     def collect_content(self):
         """Collect all markdown files from content directory"""
         self.pages = []  # Clear pages list before collecting
@@ -677,230 +2585,1181 @@ class Builder:
         for md_file in content_dir.rglob('*.md'):
             page = ContentFile(md_file)
             self.pages.append(page)
+        self.index = PageIndex(self.pages)
+        self.sitemap_pages = self.sitemap_entries()
+        self.redirects = self.collect_redirects()
+        self.assets = self.collect_assets()
+        self.graph = self.build_graph()
 
         print(f'Collected {len(self.pages)} content files')
         return self.pages
 
-    def render_content(self):
-        """Render all markdown content to HTML"""
-        for page in self.pages:
-            page.render()
-        print(f'Rendered {len(self.pages)} pages')
+    def load_short_urls(self):
+        """Load the entries of short-urls.yaml"""
+        short_urls_path = Path('short-urls.yaml')
+        if not short_urls_path.exists():
+            return []
+        with open(short_urls_path, 'r', encoding='utf-8') as f:
+            return yaml.safe_load(f) or []
 
-    def generate_pages(self):
-        """Generate all HTML pages"""
-        # Filter out drafts
-        published_pages = [p for p in self.pages if not p.is_draft]
-        draft_count = len(self.pages) - len(published_pages)
-
-        # Separate pages with external links (no individual page generation)
-        internal_pages = [p for p in published_pages if not p.external_link]
-        external_link_count = len(published_pages) - len(internal_pages)
-
-        # Group pages by section (include external links for listing)
-        by_section = defaultdict(list)
-        for page in published_pages:
-            if page.section:
-                by_section[page.section].append(page)
+    def page_outputs(self, page):
+        """Outputs written for the page itself: its own HTML page, and its aliases when they are hardlinks"""
+        if page.is_draft or page.external_link:
+            return []
+        if self.alias_mode != 'hardlink':
+            return [output_path_for_url(page.url)]
+        return [output_path_for_url(page.url)] + [output_path_for_url(alias) for alias in page.aliases]
 
-        # Generate individual pages (only for internal pages, not external links)
-        for page in internal_pages:
-            html = post_template(page)
+    def collect_redirects(self):
+        """
+        Index every page alias and short URL by the output it would be written to.
 
-            # Write to public directory
-            output_path = self.public_dir / page.url.strip('/') / 'index.html'
+        Redirects are checked as they are indexed: the same redirect listed twice is only reported,
+        but a redirect from the URL of a page, or from the same URL to different targets, fails
+        the build with a ValueError listing every conflict.
+        """
+        candidates = [
+            (alias, page.url, str(page.path), None) for page in self.index.internal for alias in page.aliases
+        ]
+        candidates += [
+            (entry['short_url'], entry['long_url'], 'short-urls.yaml', entry) for entry in self.load_short_urls()
+        ]
+        pages = {output for _, output in self.sitemap_pages} | {f'{SEARCH_DIR}/index.html'}
+
+        redirects = {}
+        conflicts = []
+        for source, target, origin, entry in candidates:
+            output = output_path_for_url(source)
+            url = f'/{source.strip("/")}/' if source.strip('/') else '/'
+            if output in pages:
+                conflicts.append(f'{url} ({origin}) is the URL of a page')
+            elif url == target:
+                conflicts.append(f'{url} ({origin}) redirects to itself')
+            elif output in redirects:
+                _, other_target, other_origin, _ = redirects[output]
+                if other_target == target:
+                    print(f'Duplicate redirect {url} -> {target} ({origin}, already in {other_origin})')
+                else:
+                    conflicts.append(
+                        f'{url} redirects to {other_target} ({other_origin}) and to {target} ({origin})'
+                    )
+            else:
+                redirects[output] = (url, target, origin, entry)
+        if conflicts:
+            raise ValueError('Conflicting redirects:\n  ' + '\n  '.join(conflicts))
+        return dict(sorted(redirects.items()))
+
+    def build_graph(self):
+        """
+        Build the dependency graph of the current content.
+
+        Mirrors what the generators read: a post feeds its own page and aliases, its section list
+        and feed, the homepage only if it's among the recent items shown there, the main feed only
+        if it's among its most recent items, each of its series pages and the sitemap.
+        """
+        graph = DependencyGraph()
+        index = self.index
+
+        # Every HTML page links the stylesheet and the avatar/favicons through their fingerprinted URLs
+        template_assets = [
+            str(self.assets[url.lstrip('/')]) for url in (STYLESHEET_URL, AVATAR_URL, FAVICON_SVG, FAVICON_32)
+            if url.lstrip('/') in self.assets
+        ]
+
+        def templates(*names):
+            return [f'templates/{name}' for name in BASE_TEMPLATES + names] + template_assets
+
+        # Pages and listings also depend on the responsive variants of the images they show
+        bundle_images = defaultdict(list)
+        for output, source in self.images().items():
+            bundle_images[str(source.parent / 'post.md')].append(str(source))
+
+        def featured_images(pages):
+            sources = (self.assets.get(p.featured_image.lstrip('/')) for p in pages)
+            return [str(source) for source in sources if source is not None]
+
+        for page in index.published:
+            page_template = 'post.html' if page.section in ["posts"] else 'page.html'
+            for output in self.page_outputs(page):
+                graph.add(
+                    output, str(page.path), *bundle_images[str(page.path)],
+                    *templates(page_template, *PAGE_TEMPLATES)
+                )
+
+        # Each page of a listing shows its own slice, and also depends on which items the slice holds
+        self.virtual_inputs = {}
+        for _, template, listing in self.listings():
+            for number, (url, items) in enumerate(listing, 1):
+                graph.add(
+                    output_path_for_url(url), *[str(p.path) for p in items], *featured_images(items),
+                    self.listing_input(listing, number), *templates(template, 'list-item.html', 'pagination.html')
+                )
+
+        home_pages = [p for section in HOME_SECTIONS for p in index.recent(section, HOME_ITEMS)]
+        graph.add(
+            'index.html', *[str(p.path) for p in home_pages], *featured_images(home_pages),
+            *templates('home.html', 'list-item.html')
+        )
+
+        for section_name, pages in index.feeds():
+            for output in feed_outputs(section_name).values():
+                graph.add(output, *[str(p.path) for p in pages[:FEED_ITEMS]])
+
+        graph.add('404.html', *templates('404.html'))
+
+        search_pages = [str(p.path) for p in index.internal]
+        graph.add(f'{SEARCH_DIR}/index.json', *search_pages)
+        graph.add(f'{SEARCH_DIR}/docs.json', *search_pages)
+        search_script = [
+            str(self.assets[url]) for url in (SEARCH_SCRIPT_URL.lstrip('/'),) if url in self.assets
+        ]
+        graph.add(f'{SEARCH_DIR}/index.html', *templates('search.html'), *search_script)
+
+        # Redirect pages only depend on where they point (and, for short URLs, their link previews)
+        for output, (_, _, origin, entry) in self.redirects.items():
+            if entry is not None:
+                graph.add(output, origin, 'templates/redirect.html', 'templates/short-url.html', 'templates/meta-image.html')
+            elif self.alias_mode != 'hardlink':
+                graph.add(output, origin, 'templates/redirect.html')
+        redirect_origins = sorted({origin for _, _, origin, _ in self.redirects.values()})
+        for output in REDIRECT_MAPS.values():
+            graph.add(output, 'short-urls.yaml', *redirect_origins)
+
+        # The sitemap lists pages and when their content last changed, but not how they look
+        sitemap_inputs = [source for source in graph.inputs() if is_content_input(source)]
+        shards = SitemapGenerator.split([url for url, _ in self.sitemap_pages])
+        for output in SitemapGenerator.outputs(len(shards)):
+            graph.add(output, *sitemap_inputs)
+
+        return graph
+
+    def listings(self):
+        """(name, template, paginated listing) of every section list and series page"""
+        for section, pages in self.index.by_section.items():
+            yield section, 'list.html', paginate(f'/{section}/', pages)
+        for series_name, pages in self.index.by_series.items():
+            yield series_name, 'series.html', paginate(f'/series/{series_slug(series_name)}/', pages)
+
+    def listing_input(self, listing, number):
+        """
+        Virtual input standing for the items on page `number` of a listing.
+
+        Its hash changes when items move in or out of the page, or the page gains or loses a
+        next page, even if none of the items changed themselves (e.g. when a post is added).
+        """
+        url, items = listing[number - 1]
+        source = f'@listing{url}'
+        self.virtual_inputs[source] = DiskCache.key(*[str(p.path) for p in items], str(number < len(listing)))
+        return source
+
+    def sitemap_entries(self):
+        """(URL, output) of every HTML page listed in the sitemap, homepage first"""
+        entries = {'/': 'index.html'}
+        for page in self.index.internal:
+            entries.setdefault(page.url, output_path_for_url(page.url))
+        for _, _, listing in self.listings():
+            for url, _ in listing:
+                entries.setdefault(url, output_path_for_url(url))
+        return list(entries.items())
+
+    def track_lastmod(self, previous):
+        """
+        Record when the content of each sitemap page last changed.
+
+        A page's content signature hashes its content inputs; its lastmod moves to today only when
+        that changes. Pages seen for the first time start from the newest date of the pages they show.
+        """
+        today = datetime.now().strftime('%Y-%m-%d')
+        pages = {str(p.path): p for p in self.pages}
+        for _, output in self.sitemap_pages:
+            sources = [source for source in self.graph.inputs_of(output) if is_content_input(source)]
+            signature = DiskCache.key(*(f'{source}:{self.manifest.inputs.get(source, "")}' for source in sources))
+            record = previous.lastmod.get(output) if previous else None
+            if record and record[0] == signature:
+                self.manifest.lastmod[output] = record
+                continue
+            if record:
+                lastmod = today
+            else:
+                dates = [pages[source].date.strftime('%Y-%m-%d') for source in sources if source in pages]
+                lastmod = min(max(dates), today) if dates else today
+            self.manifest.lastmod[output] = [signature, lastmod]
+
+    def images(self):
+        """Raster images from post bundles (output path -> source file), candidates for responsive variants"""
+        return {
+            output: source for output, source in self.assets.items()
+            if source.parts[0] == 'content' and output.rsplit('.', 1)[-1].lower() in IMAGE_EXTENSIONS
+        }
+
+    @build_phase
+    def process_images(self):
+        """Generate the responsive WebP variants of the images in post bundles"""
+        if not ImagePipeline.is_available():
+            print('Pillow is not installed, skipping responsive images')
+            return
+        # Encoding is CPU bound and independent of page rendering: always use every CPU
+        encoded = IMAGES.process(self.images())
+        print(f'Generated {len(IMAGES.outputs)} responsive image variants ({encoded} encoded)')
+
+    def input_hash(self, source):
+        """
+        Hash of an input for change detection.
+
+        Images in post bundles only matter through their variants, and fingerprinted static
+        assets through their fingerprint. Virtual inputs (names starting with '@') are hashed
+        when the graph is built.
+        """
+        if source in self.virtual_inputs:
+            return self.virtual_inputs[source]
+        if source in ASSETS.digests:
+            return ASSETS.digests[source]
+        if source.rsplit('.', 1)[-1].lower() in IMAGE_EXTENSIONS:
+            return IMAGES.signatures.get(source, '')
+        return hash_file(source)
+
+    @build_phase
+    def fingerprint_assets(self):
+        """Make content-hashed copies of the files in static/"""
+        ASSETS.process({output: source for output, source in self.assets.items() if source.parts[0] == 'static'})
+        self.assets.update(ASSETS.copies)
+        print(f'Fingerprinted {len(ASSETS.urls)} static assets')
+
+    @build_phase
+    def generate_asset_manifest(self):
+        """Write the rewritten stylesheets and the manifest of fingerprinted asset URLs"""
+        for output, data in ASSETS.generated.items():
+            self.write_output(output, data)
+        self.write_output(ASSET_MANIFEST, ASSETS.manifest())
+
+    @build_phase
+    def plan_build(self):
+        """
+        Decide what needs to be regenerated.
+
+        Without --incremental, or when there is no usable manifest from a previous build, or when
+        the configuration changed, everything is regenerated. Otherwise only the outputs that
+        depend on added, modified or removed inputs (according to the old and the new dependency
+        graph) are marked dirty.
+        """
+        previous = BuildManifest.load()
+        self.subset_fonts = FontSubsetter.is_available()
+        if self.require_fonts and not self.subset_fonts:
+            raise RuntimeError(
+                'Web fonts can\'t be subset: install fontTools and run `python build.py fetch-fonts` '
+                '(or build without --require-fonts to link Google Fonts)'
+            )
+        self.manifest = BuildManifest()
+        self.manifest.config = config_hash(self.alias_mode, self.subset_fonts)
+        # Pages that aren't written again keep the charset of their last build
+        self.manifest.charsets = dict(previous.charsets) if previous else {}
+        self.manifest.search_ids = dict(previous.search_ids) if previous else {}
+        self.manifest.graph = self.graph
+        self.manifest.inputs = {source: self.input_hash(source) for source in self.graph.inputs()}
+        self.track_lastmod(previous)
+
+        if not self.incremental or previous is None or self.force_clean or not self.public_dir.exists():
+            self.dirty = None
+            return
+        if previous.config != self.manifest.config:
+            print('Configuration changed, rebuilding everything')
+            self.dirty = None
+            return
+
+        self.dirty = set()
+        changed = sorted(
+            source for source in set(previous.inputs) | set(self.manifest.inputs)
+            if previous.inputs.get(source) != self.manifest.inputs.get(source)
+        )
+        reasons = defaultdict(list)
+        for source in changed:
+            for output in set(previous.graph.outputs_affected_by(source)) | set(self.graph.outputs_affected_by(source)):
+                reasons[output].append(source)
+        self.dirty.update(reasons)
+
+        print(f'Incremental build: {len(changed)} changed inputs, {len(self.dirty)} outputs to regenerate')
+        if self.explain:
+            for output in sorted(reasons):
+                print(f'  {output} <- {", ".join(reasons[output])}')
+
+    def is_dirty(self, output):
+        """True if the given output (relative to public/) must be regenerated"""
+        return self.dirty is None or output in self.dirty
+
+    def write_output(self, output, content):
+        """
+        Write a generated file (path relative to public/), given as text or bytes.
+
+        Files whose content didn't change are left alone, keeping their inode and mtime. Others
+        are replaced through a temporary file, so files hardlinked from the live site while
+        staging are never written through.
+        """
+        data = content.encode('utf-8') if isinstance(content, str) else content
+        output_path = self.output_dir / output
+        self.written.add(output)
+        if self.subset_fonts and output.endswith('.html'):
+            self.manifest.charsets[output] = FontSubsetter.charset(data.decode('utf-8'))
+        try:
+            if output_path.stat().st_size == len(data) and output_path.read_bytes() == data:
+                return
+        except FileNotFoundError:
             output_path.parent.mkdir(parents=True, exist_ok=True)
-            output_path.write_text(html, encoding='utf-8')
-
-            # Handle aliases
-            for alias in page.aliases:
-                alias_path = self.public_dir / alias.strip('/') / 'index.html'
-                alias_path.parent.mkdir(parents=True, exist_ok=True)
-                alias_path.write_text(html, encoding='utf-8')
-
-        # Generate section list pages
-        for section, section_pages in by_section.items():
-            html = list_template(section, section_pages)
-            output_path = self.public_dir / section / 'index.html'
+        tmp_path = output_path.with_name(f'.{output_path.name}.{os.getpid()}.tmp')
+        tmp_path.write_bytes(data)
+        os.replace(tmp_path, output_path)
+        self.changed_outputs += 1
+        self.profiler.bytes_written += len(data)
+
+    @contextmanager
+    def open_output(self, output):
+        """
+        Open a generated file (path relative to public/) to be streamed in binary mode.
+
+        Like write_output(), the data goes to a temporary file that only replaces the output if
+        their content differs, so unchanged files are left alone.
+        """
+        output_path = self.output_dir / output
+        self.written.add(output)
+        output_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = output_path.with_name(f'.{output_path.name}.{os.getpid()}.tmp')
+        try:
+            with open(tmp_path, 'wb') as f:
+                yield f
+            size = tmp_path.stat().st_size
+            if not same_content(tmp_path, output_path):
+                os.replace(tmp_path, output_path)
+                self.changed_outputs += 1
+                self.profiler.bytes_written += size
+        finally:
+            tmp_path.unlink(missing_ok=True)
+
+    def link_output(self, output, target):
+        """Make an output a hardlink to another output of this build (or a copy, if links aren't supported)"""
+        output_path = self.output_dir / output
+        target_path = self.output_dir / target
+        self.written.add(output)
+        try:
+            if output_path.samefile(target_path):
+                return
+        except FileNotFoundError:
             output_path.parent.mkdir(parents=True, exist_ok=True)
-            output_path.write_text(html, encoding='utf-8')
+        tmp_path = output_path.with_name(f'.{output_path.name}.{os.getpid()}.tmp')
+        try:
+            os.link(target_path, tmp_path)
+        except OSError:
+            shutil.copyfile(target_path, tmp_path)
+        os.replace(tmp_path, output_path)
+        self.changed_outputs += 1
+
+    @build_phase
+    def stage(self, clone=True):
+        """
+        Point the build to a fresh staging directory next to public/.
 
-        # Generate homepage
-        posts = sorted([p for p in published_pages if p.section == "posts"], key=lambda x: x.date, reverse=True)
-        talks = sorted([p for p in published_pages if p.section == "talks"], key=lambda x: x.date, reverse=True)
-        homepage_html = home_template(posts, talks)
-        (self.public_dir / 'index.html').write_text(homepage_html, encoding='utf-8')
-
-        # Generate series pages
-        by_series = defaultdict(list)
-        for page in published_pages:
-            for series in page.series:
-                by_series[series].append(page)
+        Unless clone is False, the staging directory starts as a copy of the live site made of
+        hardlinks, so unchanged files keep their inode and mtime and incremental builds find the
+        outputs they don't regenerate.
+        """
+        staging = self.public_dir.with_name(f'.{self.public_dir.name}.staging')
+        if staging.exists():
+            shutil.rmtree(staging)
+        staging.mkdir()
+        if clone and self.public_dir.exists():
+            live = self.public_dir.resolve()
+            for root, dirs, files in os.walk(live):
+                relative = Path(root).relative_to(live)
+                for name in dirs:
+                    (staging / relative / name).mkdir()
+                for name in files:
+                    try:
+                        os.link(Path(root) / name, staging / relative / name)
+                    except OSError:
+                        shutil.copy2(Path(root) / name, staging / relative / name)
+        self.output_dir = staging
+
+    @build_phase
+    def swap(self):
+        """
+        Replace the live site with the staging directory.
 
-        for series_name, series_pages in by_series.items():
-            slug = series_name.lower().replace(' ', '-')
-            html = series_template(series_name, series_pages)
-            output_path = self.public_dir / 'series' / slug / 'index.html'
-            output_path.parent.mkdir(parents=True, exist_ok=True)
-            output_path.write_text(html, encoding='utf-8')
+        In 'rename' mode the staging directory and public/ are exchanged atomically with
+        renameat2() where available. Elsewhere (or for the first build) the old directory is
+        moved aside and the staging one renamed into place, which leaves a short window without
+        public/. In 'symlink' mode public/ is a symlink to the current build and is flipped
+        atomically on every platform.
+        """
+        staging, live = self.output_dir, self.public_dir
+        old = live.with_name(f'.{live.name}.old')
+        self.discard(old)
+        if self.swap_mode == 'symlink':
+            target = live.with_name(f'.{live.name}.{time.time_ns()}')
+            staging.rename(target)
+            link = live.with_name(f'.{live.name}.link')
+            if link.is_symlink():
+                link.unlink()
+            link.symlink_to(target.name, target_is_directory=True)
+            if live.is_symlink():
+                old = live.resolve()
+            elif live.exists():
+                live.rename(old)
+            os.replace(link, live)
+        elif live.exists() and not live.is_symlink() and exchange_paths(staging, live):
+            # The staging path now holds the previous build
+            old = staging
+        else:
+            if live.is_symlink() or live.exists():
+                live.rename(old)
+            staging.rename(live)
+        self.discard(old)
+        self.output_dir = live
+        print(f'Swapped the new build into {live}/')
 
-        print(f'Generated {len(internal_pages)} pages, {len(by_section)} section lists, homepage, and {len(by_series)} series pages')
-        if draft_count > 0:
-            print(f'Skipped {draft_count} draft pages')
-        if external_link_count > 0:
-            print(f'Skipped {external_link_count} pages with external links (included in listings)')
+    @staticmethod
+    def discard(path):
+        """Delete a previous build (a directory, or a symlink and the directory it points to)"""
+        if path.is_symlink():
+            target = path.resolve()
+            path.unlink()
+            shutil.rmtree(target, ignore_errors=True)
+        elif path.exists():
+            shutil.rmtree(path)
+
+    @build_phase
+    def precompress_outputs(self):
+        """Write compressed sidecars of the text outputs"""
+        compressed, unchanged = Precompressor().run(self, self.expected_outputs())
+        print(f'Precompressed {compressed} files ({unchanged} unchanged)' + (' with brotli' if brotli else ''))
+
+    def expected_outputs(self):
+        """Every file (relative to public/) that belongs to the current build"""
+        return self.graph.outputs() | set(self.assets) | self.written | self.extra_outputs
+
+    @build_phase
+    def prune_stale_outputs(self):
+        """Delete files in public/ that this build doesn't produce, and directories left empty"""
+        expected = self.expected_outputs()
+        removed = 0
+        for root, dirs, files in os.walk(self.output_dir, topdown=False):
+            root = Path(root)
+            for name in files:
+                path = root / name
+                if path.relative_to(self.output_dir).as_posix() not in expected:
+                    path.unlink()
+                    removed += 1
+            if root != self.output_dir and not any(root.iterdir()):
+                root.rmdir()
+        if removed:
+            print(f'Removed {removed} stale files')
+
+    @build_phase
+    def render_content(self, pages=None):
+        """
+        Render markdown content to HTML (by default, every page with a dirty output).
 
-    def generate_feeds(self):
-        """Generate RSS feeds"""
-        # Filter out drafts
-        published_pages = [p for p in self.pages if not p.is_draft]
+        Each page is published as soon as its HTML is ready, then its body and HTML are
+        released, unless a feed embeds it.
+        """
+        if pages is None:
+            pages = [p for p in self.pages if any(self.is_dirty(o) for o in self.page_outputs(p))]
+        pages = list(pages)
+        rendered_count = len(pages)
+        embedded = self.feed_items()
+        highlights = RENDERER_POOL.highlight_cache
+        highlight_hits, highlight_misses = (highlights.hits, highlights.misses) if highlights else (0, 0)
+
+        # Pages whose HTML is in the render cache don't need to be rendered at all
+        keys = {}
+        if self.render_cache:
+            fingerprint = render_fingerprint()
+            misses = []
+            for page in pages:
+                keys[page] = page.render_cache_key(fingerprint)
+                cached = self.render_cache.get(keys[page])
+                if cached is None:
+                    misses.append(page)
+                else:
+                    page.html_content = cached.decode('utf-8')
+                    page.is_rendered = True
+                    self.publish_page(page, embedded)
+            pages = misses
+
+        for page, timings in self.iter_rendered(pages):
+            if timings:
+                self.profiler.record_render(page, timings)
+            if self.render_cache:
+                self.render_cache.set(keys[page], page.html_content.encode('utf-8'))
+            self.publish_page(page, embedded)
+
+        if self.render_cache:
+            print(f'Rendered {rendered_count} pages ({rendered_count - len(pages)} from cache)')
+        else:
+            print(f'Rendered {rendered_count} pages')
+        hits, misses = (highlights.hits - highlight_hits, highlights.misses - highlight_misses) if highlights else (0, 0)
+        if hits or misses:
+            print(f'Highlighted {hits + misses} code blocks ({hits} from cache)')
+
+    def iter_rendered(self, pages):
+        """Render pages, yielding each one (with its timings when profiling) as soon as it's done"""
+        if self.jobs > 1 and len(pages) > 1:
+            # Rendering is CPU-bound: spread it over worker processes and only ship the HTML back
+            highlights = RENDERER_POOL.highlight_cache
+            highlight_dir = highlights.directory if highlights else None
+            with ProcessPoolExecutor(
+                max_workers=self.jobs, initializer=configure_highlight_cache, initargs=(highlight_dir,)
+            ) as executor:
+                chunksize = max(1, len(pages) // (self.jobs * 4))
+                render = partial(render_file, profile=self.profiler.enabled)
+                results = executor.map(render, [p.path for p in pages], chunksize=chunksize)
+                for page, (html, timings, worker_highlights) in zip(pages, results):
+                    if highlights:
+                        # Count the cache lookups of the workers along with those of this process
+                        highlights.hits += worker_highlights[0]
+                        highlights.misses += worker_highlights[1]
+                    page.html_content = html
+                    page.is_rendered = True
+                    yield page, timings
+        else:
+            for page in pages:
+                timings = {} if self.profiler.enabled else None
+                page.render(timings)
+                yield page, timings
+
+    def publish_page(self, page, embedded=()):
+        """Write the dirty outputs of a rendered page, then release it unless it's in `embedded`"""
+        if self.page_outputs(page):
+            self.search.add(self.search_key(page), page)
+        page_output, *alias_outputs = self.page_outputs(page) or [None]
+        outputs = [o for o in self.page_outputs(page) if self.is_dirty(o)]
+        if outputs:
+            if page_output in outputs:
+                self.write_output(page_output, post_template(page))
+            # Hardlinked aliases share the page's file
+            for output in alias_outputs:
+                if output in outputs:
+                    self.link_output(output, page_output)
+            self.published_pages += 1
+        if page not in embedded:
+            page.release()
+
+    def search_key(self, page):
+        """Key of a page's search terms: its URL and source, plus the tokenizer and renderer setup"""
+        return DiskCache.key(self.search.fingerprint, page.url, self.manifest.inputs[str(page.path)])
+
+    def feed_items(self):
+        """Pages whose HTML is embedded in a feed: the most recent ones of each feed"""
+        return {p for _, pages in self.index.feeds() for p in pages[:FEED_ITEMS]}
+
+    @build_phase
+    def generate_pages(self):
+        """Generate the section lists, homepage and series pages (posts are written as they're rendered)"""
+        index = self.index
 
-        # Main feed
-        all_pages = [p for p in published_pages if p.section in ['posts', 'talks', 'demos', 'projects', 'publications']]
-        RSSGenerator.generate(all_pages, self.public_dir / 'index.xml')
+        # Generate every page of the section lists (including external links) and series pages
+        for name, template, listing in self.listings():
+            render = list_template if template == 'list.html' else series_template
+            for number, (url, items) in enumerate(listing, 1):
+                output = output_path_for_url(url)
+                if self.is_dirty(output):
+                    self.write_output(output, render(name, items, url, number, pagination_html(listing, number)))
 
-        # Section feeds
-        by_section = defaultdict(list)
-        for page in published_pages:
-            if page.section:
-                by_section[page.section].append(page)
+        # Generate homepage
+        if self.is_dirty('index.html'):
+            self.write_output('index.html', home_template(index.recent('posts', HOME_ITEMS), index.recent('talks', HOME_ITEMS)))
 
-        for section, pages in by_section.items():
-            RSSGenerator.generate(pages, self.public_dir / section / 'index.xml', section)
+        print(
+            f'Generated {self.published_pages} pages, {len(index.by_section)} section lists, homepage, '
+            f'and {len(index.by_series)} series pages'
+        )
+        if index.draft_count > 0:
+            print(f'Skipped {index.draft_count} draft pages')
+        if index.external_link_count > 0:
+            print(f'Skipped {index.external_link_count} pages with external links (included in listings)')
+
+    def generate_feed(self, pages, section_name=''):
+        """Generate the feeds of a section in every format, rendering the pages they embed if needed"""
+        outputs = feed_outputs(section_name)
+        if not any(self.is_dirty(output) for output in outputs.values()):
+            return
+        unrendered = [p for p in pages[:FEED_ITEMS] if not p.is_rendered]
+        if unrendered:
+            self.render_content(unrendered)
+        with ExitStack() as stack:
+            files = {fmt: stack.enter_context(self.open_output(output)) for fmt, output in outputs.items()}
+            FeedGenerator.write(pages, files, section_name)
+
+    @build_phase
+    def generate_feeds(self):
+        """Generate the main feed and one per section, as RSS, Atom and JSON Feed"""
+        for section_name, pages in self.index.feeds():
+            self.generate_feed(pages, section_name)
 
-        print(f'Generated main RSS feed and {len(by_section)} section feeds')
+        print(f'Generated main feed and {len(self.index.by_section)} section feeds (RSS, Atom, JSON Feed)')
 
+    @build_phase
     def generate_sitemap(self):
-        """Generate sitemap.xml"""
-        # Filter out drafts
-        published_pages = [p for p in self.pages if not p.is_draft]
-        SitemapGenerator.generate(published_pages, self.public_dir / 'sitemap.xml')
-        print('Generated sitemap.xml')
+        """Generate sitemap.xml (a sitemap index when it's split), with the lastmods of the manifest"""
+        if not self.is_dirty('sitemap.xml'):
+            return
+        entries = [(url, self.manifest.lastmod[output][1]) for url, output in self.sitemap_pages]
+        files = 0
+        for output, data in SitemapGenerator.generate(entries):
+            self.write_output(output, data)
+            files += 1
+        if files > 1:
+            print(f'Generated sitemap.xml ({len(entries)} URLs in {files - 1} files)')
+        else:
+            print(f'Generated sitemap.xml ({len(entries)} URLs)')
+
+    @build_phase
+    def generate_search_index(self):
+        """Generate the search page and the search index of every page with content"""
+        if self.is_dirty(f'{SEARCH_DIR}/index.html'):
+            template = TemplateLoader.compiled('search.html')
+            content_html = template.render(search_script_url=asset_url(SEARCH_SCRIPT_URL))
+            self.write_output(f'{SEARCH_DIR}/index.html', base_template(content_html, 'Search', page_url=f'/{SEARCH_DIR}/'))
+
+        index_output = f'{SEARCH_DIR}/index.json'
+        if not self.is_dirty(index_output):
+            # Keep the shards of the current index
+            try:
+                shards = json.loads((self.output_dir / index_output).read_bytes())['shards']
+                self.extra_outputs.update(f'{SEARCH_DIR}/{name}.json' for name in shards)
+            except (OSError, ValueError, KeyError):
+                pass
+            return
 
+        # New pages get their ids oldest first (undated pages before every post)
+        docs = sorted(
+            self.index.internal,
+            key=lambda p: ('date' in p.front_matter, p.date if 'date' in p.front_matter else datetime.min, p.url),
+        )
+        keys = [self.search_key(p) for p in docs]
+        # Pages neither rendered by this build nor in the cache are rendered (and tokenized) now
+        missing = [p for p, key in zip(docs, keys) if not self.search.has(key)]
+        if missing:
+            self.render_content(missing)
+        ids = SearchIndex.assign_ids(self.manifest.search_ids, docs)
+        outputs = self.search.build(docs, keys, ids)
+        for output, data in outputs.items():
+            self.write_output(output, data)
+        print(
+            f'Generated search index of {len(docs)} pages in {len(outputs) - 2} shards '
+            f'({self.search.tokenized} pages tokenized)'
+        )
+
+    @build_phase
+    def generate_fonts(self):
+        """Subset the web fonts to the characters of every HTML page, and write their stylesheet"""
+        if not self.subset_fonts:
+            return
+        expected = self.expected_outputs()
+        self.manifest.charsets = {o: c for o, c in self.manifest.charsets.items() if o in expected}
+        chars = set(''.join(self.manifest.charsets.values()))
+        for output, data in FONTS.generate(chars).items():
+            self.write_output(output, data)
+        chars.update(FONT_BASE_CHARSET)
+        print(f'Generated font subsets for {len(chars)} characters ({FONTS.subset_count} subset)')
+
+    @build_phase
     def generate_404_page(self):
         """Generate 404 error page"""
+        if not self.is_dirty('404.html'):
+            return
         template = TemplateLoader.load('404.html')
         html = base_template(template, '404 - Page Not Found')
-
-        output_path = self.public_dir / '404.html'
-        output_path.write_text(html, encoding='utf-8')
+        self.write_output('404.html', html)
         print('Generated 404.html')
 
-    def copy_static_assets(self):
-        """Copy static assets to public directory"""
+    def collect_assets(self):
+        """Map every published asset (path relative to public/) to its source file"""
+        assets = {}
         # Create a set of published page paths for quick lookup
         published_paths = {p.path for p in self.pages if not p.is_draft}
 
-        # Copy assets from content directories (images alongside post.md files)
+        # Assets from content directories (images alongside post.md files)
         content_dir = Path('content')
         for section_dir in content_dir.iterdir():
             if not section_dir.is_dir():
                 continue
 
             for item_dir in section_dir.iterdir():
-                if not item_dir.is_dir():
+                # Only bundles of published posts (directories with a non-draft post.md)
+                if not item_dir.is_dir() or item_dir / 'post.md' not in published_paths:
                     continue
+                for file in item_dir.iterdir():
+                    if file.is_file() and not file.name.endswith('.md'):
+                        assets[f'{section_dir.name}/{item_dir.name}/{file.name}'] = file
 
-                # Check if this directory contains a post.md file
-                post_md_path = item_dir / 'post.md'
-                if post_md_path.exists():
-                    # Skip if this is a draft post
-                    if post_md_path not in published_paths:
-                        continue
+        # Global assets from static/, which take precedence (except the sources of the font subsets)
+        static_dir = Path('static')
+        font_sources = FontSubsetter.sources()
+        if static_dir.exists():
+            for file in static_dir.rglob('*'):
+                if file.is_file() and file not in font_sources:
+                    assets[file.relative_to(static_dir).as_posix()] = file
 
-                    # Copy all non-.md files from this directory
-                    dest_dir = self.public_dir / section_dir.name / item_dir.name
-                    dest_dir.mkdir(parents=True, exist_ok=True)
+        # robots.txt can also live in content/
+        if 'robots.txt' not in assets and (content_dir / 'robots.txt').exists():
+            assets['robots.txt'] = content_dir / 'robots.txt'
 
-                    for file in item_dir.iterdir():
-                        if file.is_file() and not file.name.endswith('.md'):
-                            shutil.copy2(file, dest_dir / file.name)
+        return assets
 
-        print('Copied assets from content directories')
-
-        # Copy from static/ if it still exists (for global assets)
-        if Path('static').exists():
-            shutil.copytree('static', self.public_dir, dirs_exist_ok=True)
-            print('Copied static/ assets')
-
-        # Copy robots.txt if exists
-        robots_path = Path('static/robots.txt')
-        if not robots_path.exists():
-            robots_path = Path('content/robots.txt')
-        if robots_path.exists():
-            shutil.copy(robots_path, self.public_dir / 'robots.txt')
+    @build_phase
+    def copy_static_assets(self):
+        """Sync assets to the public directory, copying only new or changed files"""
+        self.assets.update(IMAGES.outputs)
+        for output, source in self.assets.items():
+            self.asset_sync.sync(source, self.output_dir / output)
+        print(f'Synced {len(self.assets)} assets ({self.asset_sync.copied} copied)')
 
     def clean(self):
         """Clean the public directory"""
-        if self.public_dir.exists():
+        if self.output_dir.exists():
             # Remove all contents without deleting the directory itself - the webserver is running there
-            for item in self.public_dir.iterdir():
+            for item in self.output_dir.iterdir():
                 if item.is_dir():
                     shutil.rmtree(item)
                 else:
                     item.unlink()
         else:
-            self.public_dir.mkdir()
+            self.output_dir.mkdir()
         print('Cleaned public directory')
 
-    def generate_short_urls(self):
-        """Generate redirect pages for short URLs defined in short-urls.yaml"""
-        short_urls_path = Path('short-urls.yaml')
-        if not short_urls_path.exists():
-            return
-
-        with open(short_urls_path, 'r', encoding='utf-8') as f:
-            entries = yaml.safe_load(f) or []
-
+    @build_phase
+    def generate_redirects(self):
+        """Generate redirect pages for page aliases and short-urls.yaml, and the redirect maps"""
         count = 0
-        for entry in entries:
-            short = entry['short_url']
-            long_url = entry['long_url']
-            title = entry.get('title', 'Redirecting...')
-            description = entry.get('description', f'Redirecting to {long_url}')
-            image = entry.get('image', '')
-
-            # meta refresh + optional OG image go in <head> via meta_tags slot
-            meta_tags = f'<meta http-equiv="refresh" content="0; url={escape(long_url)}">\n'
-            if image:
-                meta_template = TemplateLoader.load('meta-image.html')
-                meta_tags += meta_template.format(image_url=image, base_url=BASE_URL)
-
-            template = TemplateLoader.load('short-url.html')
-            content_html = template.format(
-                title=escape(title),
-                description=escape(description),
-                long_url=escape(long_url),
-                image=escape(image),
-            )
-
-            html = base_template(content_html, title, meta_tags, page_url=f'/{short}/')
-            output_path = self.public_dir / short / 'index.html'
-            output_path.parent.mkdir(parents=True, exist_ok=True)
-            output_path.write_text(html, encoding='utf-8')
+        for output, (url, target, _, entry) in self.redirects.items():
+            if not self.is_dirty(output) or (entry is None and self.alias_mode == 'hardlink'):
+                continue
+            self.write_output(output, redirect_template(url, target, entry))
             count += 1
 
-        print(f'Generated {count} short URL redirects')
+        for name, output in REDIRECT_MAPS.items():
+            if self.is_dirty(output):
+                self.write_output(output, redirect_map(name, self.redirects.values()))
+        print(f'Generated {count} redirect pages ({len(self.redirects)} redirects)')
 
     def build(self):
         """Main build process"""
         print('Starting build...')
-        self.clean()
+        self.prepare()
+        if self.swap_mode:
+            self.stage(clone=not self.force_clean)
+        elif self.force_clean:
+            self.clean()
+        self.output_dir.mkdir(exist_ok=True)
+        self.generate()
+        self.copy_static_assets()
+        if self.precompress:
+            self.precompress_outputs()
+        self.prune_stale_outputs()
+        if self.swap_mode:
+            self.swap()
+        print(f'{self.changed_outputs} generated files changed')
+        self.finish()
+        print('Build complete!')
+
+    def prepare(self):
+        """Collect the content and assets, and work out what needs to be regenerated"""
+        TemplateLoader.reset()
         self.collect_content()
+        self.fingerprint_assets()
+        self.process_images()
+        self.plan_build()
+
+    def generate(self):
+        """Render the content and generate every dirty page, feed and sitemap"""
+        self.published_pages = 0
+        # Outputs of this build only: a watch mode rebuild must not keep those of the previous one
+        self.written, self.extra_outputs = set(), set()
+        self.generate_asset_manifest()
         self.render_content()
         self.generate_pages()
-        self.generate_short_urls()
+        self.generate_redirects()
         self.generate_feeds()
         self.generate_sitemap()
+        self.generate_search_index()
         self.generate_404_page()
-        self.copy_static_assets()
-        print('Build complete!')
+        self.generate_fonts()
+
+    @build_phase
+    def finish(self):
+        """Persist the build state for the next build"""
+        self.manifest.save()
+        if self.render_cache:
+            evicted = self.render_cache.prune()
+            if evicted:
+                print(f'Evicted {evicted} entries from the render cache')
+        if self.subset_fonts:
+            evicted = FONTS.cache.prune()
+            if evicted:
+                print(f'Evicted {evicted} entries from the font subset cache')
+        if RENDERER_POOL.highlight_cache:
+            evicted = RENDERER_POOL.highlight_cache.prune()
+            if evicted:
+                print(f'Evicted {evicted} entries from the highlight cache')
+        if self.search.cache:
+            evicted = self.search.cache.prune()
+            if evicted:
+                print(f'Evicted {evicted} entries from the search token cache')
+
+    def asset_destination(self, path):
+        """
+        Where a source asset is copied to in public/, or None if it isn't published.
+
+        Handles files in static/ and files in post bundles (directories containing a post.md).
+        """
+        path = Path(path)
+        if path.parts[0] == 'static' and len(path.parts) > 1:
+            return self.output_dir.joinpath(*path.parts[1:])
+        if path.parts[0] == 'content' and len(path.parts) == 4 and path.suffix != '.md':
+            post_md_path = path.parent / 'post.md'
+            if any(p.path == post_md_path and not p.is_draft for p in self.pages):
+                return self.output_dir.joinpath(*path.parts[1:])
+        return None
+
+    def copy_asset(self, path):
+        """Sync a single changed asset to public/, or remove its copy if the source is gone"""
+        dest = self.asset_destination(path)
+        if dest is None:
+            return
+        if Path(path).is_file():
+            if self.asset_sync.sync(path, dest):
+                print(f'Copied {path}')
+        elif dest.is_file():
+            dest.unlink()
+            print(f'Removed {dest}')
+
+    def remove_outputs(self, outputs):
+        """
+        Delete outputs the previous build produced and this one doesn't (e.g. pages turned into
+        drafts, or stylesheets with an old fingerprint), with their compressed sidecars, and the
+        directories they leave empty. Cheaper than prune_stale_outputs() for small rebuilds.
+        """
+        removed = 0
+        for output in sorted(outputs):
+            for path in (self.output_dir / output, self.output_dir / f'{output}.gz', self.output_dir / f'{output}.br'):
+                if path.is_file() or path.is_symlink():
+                    path.unlink()
+                    removed += 1
+            parent = (self.output_dir / output).parent
+            while parent != self.output_dir and parent.is_dir() and not any(parent.iterdir()):
+                parent.rmdir()
+                parent = parent.parent
+        if removed:
+            print(f'Removed {removed} stale files')
+
+    def rebuild(self, paths):
+        """
+        Rebuild after the given source files changed (used by watch mode).
+
+        Content, template and short URL changes go through an incremental build of the pages,
+        which then deletes the outputs it no longer produces; changed assets are copied one by one
+        instead of copying every asset again.
+        """
+        paths = [Path(p) for p in paths]
+        assets = set()
+        pages_changed = False
+        for path in paths:
+            if path.parts[0] == 'content' and path.suffix[1:].lower() in IMAGE_EXTENSIONS:
+                # Images also change responsive variants and the pages showing them
+                pages_changed = True
+                assets.add(path)
+            elif path.parts[0] == 'static':
+                # Static assets also change fingerprinted URLs used by every page
+                pages_changed = True
+                assets.add(path)
+            elif path.suffix == '.md' or path.parts[0] == 'templates' or path == Path('short-urls.yaml'):
+                pages_changed = True
+                # A post that changes draft status also publishes or unpublishes its bundle
+                if path.name == 'post.md' and path.parent.is_dir():
+                    assets.update(p for p in path.parent.iterdir() if p.suffix != '.md')
+            else:
+                assets.add(path)
+
+        if pages_changed:
+            previous_outputs = self.expected_outputs()
+            self.incremental = True
+            self.prepare()
+            self.generate()
+            self.assets.update(IMAGES.outputs)
+            for output, source in {**ASSETS.copies, **IMAGES.outputs}.items():
+                self.asset_sync.sync(source, self.output_dir / output)
+            self.remove_outputs(previous_outputs - self.expected_outputs())
+            self.finish()
+        elif not self.pages:
+            self.collect_content()
+        for path in sorted(assets):
+            self.copy_asset(path)
+
+
+# Source directories watched in watch mode (short-urls.yaml is watched too)
+WATCHED_DIRS = ('content', 'templates', 'static')
+
+LIVERELOAD_PATH = '/__livereload'
+
+LIVERELOAD_SCRIPT = f'''<script>
+    new EventSource('{LIVERELOAD_PATH}').onmessage = function() {{ location.reload(); }};
+  </script>
+'''
+
+
+class DevServerHandler(SimpleHTTPRequestHandler):
+    """Serve public/, optionally injecting the live-reload script in HTML pages"""
+
+    def do_GET(self):
+        if self.path == LIVERELOAD_PATH:
+            return self.stream_reloads()
+        if self.server.livereload and self.serve_html_with_livereload():
+            return
+        super().do_GET()
+
+    def serve_html_with_livereload(self):
+        """Serve an HTML page with the live-reload script. False if the path isn't an HTML page."""
+        url_path = self.path.split('?', 1)[0].split('#', 1)[0]
+        path = Path(self.translate_path(self.path))
+        if path.is_dir():
+            if not url_path.endswith('/'):
+                return False  # let SimpleHTTPRequestHandler redirect to the trailing slash
+            path = path / 'index.html'
+        if path.suffix != '.html' or not path.is_file():
+            return False
+        html = path.read_text(encoding='utf-8').replace('</body>', LIVERELOAD_SCRIPT + '</body>', 1)
+        body = html.encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('Cache-Control', 'no-store')
+        self.end_headers()
+        self.wfile.write(body)
+        return True
+
+    def stream_reloads(self):
+        """Server-sent events endpoint: sends a message every time the site is rebuilt"""
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Cache-Control', 'no-store')
+        self.end_headers()
+        version = self.server.version
+        try:
+            while True:
+                with self.server.rebuilt:
+                    self.server.rebuilt.wait_for(lambda: self.server.version != version, timeout=15)
+                if self.server.version != version:
+                    version = self.server.version
+                    self.wfile.write(b'data: reload\n\n')
+                else:
+                    self.wfile.write(b': keepalive\n\n')
+                self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+    def log_message(self, format, *args):
+        pass
+
+
+class DevServer(ThreadingHTTPServer):
+    """Development web server for public/ with an optional live-reload endpoint"""
+    daemon_threads = True
+
+    def __init__(self, port, directory, livereload=False):
+        handler = partial(DevServerHandler, directory=str(directory))
+        super().__init__(('', port), handler)
+        self.livereload = livereload
+        self.version = 0
+        self.rebuilt = threading.Condition()
+
+    def start(self):
+        """Serve in a background thread"""
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+
+    def notify_rebuild(self):
+        """Tell connected browsers to reload"""
+        with self.rebuilt:
+            self.version += 1
+            self.rebuilt.notify_all()
+
+
+class SourceChangeHandler(FileSystemEventHandler):
+    """Collect the source files touched by filesystem events"""
+
+    def __init__(self):
+        super().__init__()
+        self.lock = threading.Lock()
+        self.changed = set()
+        self.last_event = 0
+
+    def on_any_event(self, event):
+        if event.is_directory or event.event_type in ('opened', 'closed', 'closed_no_write'):
+            return
+        paths = [event.src_path, getattr(event, 'dest_path', '')]
+        with self.lock:
+            for path in paths:
+                if path and self.is_source(path):
+                    self.changed.add(os.path.relpath(path))
+                    self.last_event = time.monotonic()
+
+    @staticmethod
+    def is_source(path):
+        """Ignore editor swap/backup files and files outside the watched sources"""
+        name = os.path.basename(path)
+        if name.startswith('.') or name.endswith(('~', '.swp', '.tmp')):
+            return False
+        path = Path(os.path.relpath(path))
+        return path == Path('short-urls.yaml') or path.parts[0] in WATCHED_DIRS
+
+    def pop_changes(self, debounce):
+        """Return the changed paths once no new event arrived for `debounce` seconds"""
+        with self.lock:
+            if not self.changed or time.monotonic() - self.last_event < debounce:
+                return []
+            changed, self.changed = sorted(self.changed), set()
+            return changed
+
+
+def watch(builder, port=8000, livereload=False, debounce=0.3):
+    """Build once, then serve public/ and rebuild whatever the edited sources affect"""
+    builder.incremental = True
+    builder.build()
+
+    server = DevServer(port, builder.public_dir, livereload)
+    server.start()
+    print(f'Serving {builder.public_dir}/ on http://localhost:{port}/' + (' with live reload' if livereload else ''))
+
+    handler = SourceChangeHandler()
+    observer = Observer()
+    for directory in WATCHED_DIRS:
+        if Path(directory).exists():
+            observer.schedule(handler, directory, recursive=True)
+    observer.schedule(handler, '.', recursive=False)  # short-urls.yaml
+    observer.start()
+    print('Watching for changes, press Ctrl+C to stop')
+
+    try:
+        while True:
+            time.sleep(debounce / 3)
+            changed = handler.pop_changes(debounce)
+            if not changed:
+                continue
+            print(f'Changed: {", ".join(changed)}')
+            started = time.monotonic()
+            try:
+                builder.rebuild(changed)
+            except Exception as e:
+                # Keep watching: the next save will most likely fix it
+                print(f'Rebuild failed: {e!r}')
+                continue
+            print(f'Rebuilt in {time.monotonic() - started:.2f}s')
+            server.notify_rebuild()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        observer.stop()
+        observer.join()
+        server.shutdown()
+
+
+def parse_args(argv=None):
+    """Parse command line options"""
+    parser = argparse.ArgumentParser(description=__doc__.strip())
+    parser.add_argument(
+        'command', nargs='?', choices=['build', 'watch', 'fetch-fonts'], default='build',
+        help='build the site once (default), serve it and rebuild on changes, or download the sources '
+             'of the web fonts into static/fonts/ (to commit them)'
+    )
+    parser.add_argument(
+        '--incremental', action='store_true',
+        help='only regenerate outputs whose inputs changed since the last build'
+    )
+    parser.add_argument(
+        '--explain', action='store_true',
+        help='with --incremental, print which changed inputs caused each output to be regenerated'
+    )
+    parser.add_argument(
+        '--dump-graph', metavar='FILE',
+        help='write the dependency graph between inputs and outputs to FILE as JSON'
+    )
+    parser.add_argument(
+        '-j', '--jobs', type=int, default=1, metavar='N',
+        help='render pages in N worker processes (default: 1, 0 means one per CPU)'
+    )
+    parser.add_argument(
+        '--webp-method', type=int, choices=range(7), default=IMAGE_WEBP_METHOD, metavar='0-6',
+        help=f'WebP encoder effort for responsive images, higher is smaller and slower (default: {IMAGE_WEBP_METHOD})'
+    )
+    parser.add_argument(
+        '--no-cache', dest='use_cache', action='store_false',
+        help='do not read or write the rendered markdown and highlighted code caches'
+    )
+    parser.add_argument(
+        '--link-assets', choices=AssetSync.LINK_MODES, default='copy',
+        help='how assets are put in public/: copied (default), hardlinked or reflinked when possible'
+    )
+    parser.add_argument(
+        '--aliases', choices=ALIAS_MODES, default='redirect',
+        help='publish page aliases as small redirect pages (default) or as hardlinks to the page'
+    )
+    parser.add_argument(
+        '--require-fonts', action='store_true',
+        help='fail if the web fonts can\'t be subset and self-hosted, instead of linking Google Fonts'
+    )
+    parser.add_argument(
+        '--clean', action='store_true',
+        help='empty the public directory before building'
+    )
+    parser.add_argument(
+        '--swap', choices=['rename', 'symlink'], default='rename',
+        help='how a staged build replaces public/: directory exchange (default, atomic on Linux, '
+             'two renames elsewhere) or atomic symlink flip'
+    )
+    parser.add_argument(
+        '--in-place', action='store_true',
+        help='write directly into public/ instead of a staging directory'
+    )
+    parser.add_argument(
+        '--no-precompress', dest='precompress', action='store_false',
+        help='do not write .gz/.br sidecars of text outputs'
+    )
+    parser.add_argument(
+        '--profile', nargs='?', const=str(CACHE_DIR / 'profile'), metavar='DIR',
+        help='record phase and per-page render timings, and write them to DIR (default: .cache/profile)'
+    )
+    parser.add_argument(
+        '--port', type=int, default=8000,
+        help='port of the development server in watch mode (default: 8000)'
+    )
+    parser.add_argument(
+        '--livereload', action='store_true',
+        help='in watch mode, reload open browser tabs after every rebuild'
+    )
+    return parser.parse_args(argv)
 
 
 def main():
     """Main entry point"""
-    builder = Builder()
-    builder.build()
+    args = parse_args()
+    if args.command == 'fetch-fonts':
+        if not FontSubsetter.fetch():
+            raise SystemExit(1)
+        return
+    jobs = args.jobs if args.jobs > 0 else os.cpu_count()
+    IMAGES.method = args.webp_method
+    builder = Builder(
+        incremental=args.incremental, jobs=jobs, use_cache=args.use_cache, explain=args.explain,
+        link_mode=args.link_assets, clean=args.clean,
+        swap_mode=None if args.in_place or args.command == 'watch' else args.swap,
+        precompress=args.precompress and args.command != 'watch',
+        profile=bool(args.profile), alias_mode=args.aliases, require_fonts=args.require_fonts,
+    )
+    if args.command == 'watch':
+        watch(builder, port=args.port, livereload=args.livereload)
+    else:
+        builder.build()
+    if args.dump_graph:
+        builder.graph.dump(args.dump_graph)
+    if args.profile:
+        builder.profiler.write(args.profile)
 
 
 if __name__ == '__main__':
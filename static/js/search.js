@@ -0,0 +1,169 @@
+// Client-side search over the index written by build.py to /search/ (see SearchIndex).
+// Only the shards holding the query's terms are fetched, and each one at most once.
+(function () {
+  'use strict';
+
+  var ROOT = '/search/';
+  var MAX_RESULTS = 50;
+  var TERM = /[\p{L}\p{N}_]+/gu;
+
+  var settings = null;
+  var docs = null;
+  var shards = {};
+
+  function fetchJSON(name) {
+    return fetch(ROOT + name).then(function (response) {
+      if (!response.ok) {
+        throw new Error(name + ': ' + response.status);
+      }
+      return response.json();
+    });
+  }
+
+  function loadIndex() {
+    if (!settings) {
+      settings = Promise.all([fetchJSON('index.json'), fetchJSON('docs.json')]).then(function (data) {
+        data[0].stopwords = new Set(data[0].stopwords);
+        data[0].shards = new Set(data[0].shards);
+        docs = data[1];
+        return data[0];
+      });
+    }
+    return settings;
+  }
+
+  // Same terms as search_terms() in build.py
+  function terms(text, index) {
+    return (text.toLowerCase().match(TERM) || []).filter(function (term) {
+      return Array.from(term).length >= index.min_term_length && !index.stopwords.has(term);
+    });
+  }
+
+  // Same file names as SearchIndex.shard_name() in build.py
+  function shardName(term, index) {
+    return Array.from(term).slice(0, index.prefix_length).map(function (c) {
+      return /^[a-z0-9]$/.test(c) ? c : '_' + c.codePointAt(0).toString(16);
+    }).join('');
+  }
+
+  function loadShard(name, index) {
+    if (!index.shards.has(name)) {
+      return Promise.resolve({});
+    }
+    if (!shards[name]) {
+      shards[name] = fetchJSON(name + '.json');
+    }
+    return shards[name];
+  }
+
+  // Postings are [doc id delta, term frequency, ...]: returns doc id -> frequency
+  function decode(postings, scores) {
+    var doc = 0;
+    for (var i = 0; i < postings.length; i += 2) {
+      doc += postings[i];
+      scores.set(doc, (scores.get(doc) || 0) + postings[i + 1]);
+    }
+    return scores;
+  }
+
+  // Every term must match a page; the last one also matches longer terms, as it may be half typed
+  function search(query) {
+    return loadIndex().then(function (index) {
+      var queryTerms = terms(query, index);
+      return Promise.all(queryTerms.map(function (term) {
+        return loadShard(shardName(term, index), index);
+      })).then(function (loaded) {
+        var results = null;
+        queryTerms.forEach(function (term, i) {
+          var matches = new Map();
+          var shard = loaded[i];
+          if (i === queryTerms.length - 1) {
+            Object.keys(shard).forEach(function (candidate) {
+              if (candidate.indexOf(term) === 0) {
+                decode(shard[candidate], matches);
+              }
+            });
+          } else if (shard[term]) {
+            decode(shard[term], matches);
+          }
+          if (results === null) {
+            results = matches;
+            return;
+          }
+          var both = new Map();
+          results.forEach(function (score, doc) {
+            if (matches.has(doc)) {
+              both.set(doc, score + matches.get(doc));
+            }
+          });
+          results = both;
+        });
+        return Array.from(results || []).sort(function (a, b) {
+          // New pages get the next ids: newest first among equal scores
+          return b[1] - a[1] || b[0] - a[0];
+        }).map(function (result) {
+          return docs[result[0]];
+        });
+      });
+    });
+  }
+
+  function render(results, query, list, status) {
+    list.textContent = '';
+    if (!query.trim()) {
+      status.textContent = '';
+      return;
+    }
+    status.textContent = results.length === 1 ? '1 result' : results.length + ' results';
+    results.slice(0, MAX_RESULTS).forEach(function (doc) {
+      var item = document.createElement('li');
+      var link = document.createElement('a');
+      link.href = doc[0];
+      link.textContent = doc[1];
+      item.appendChild(link);
+      var date = document.createElement('small');
+      date.textContent = ' ' + doc[2];
+      item.appendChild(date);
+      if (doc[3]) {
+        var description = document.createElement('p');
+        description.textContent = doc[3];
+        item.appendChild(description);
+      }
+      list.appendChild(item);
+    });
+  }
+
+  document.addEventListener('DOMContentLoaded', function () {
+    var form = document.getElementById('search-form');
+    var input = document.getElementById('search-input');
+    var list = document.getElementById('search-results');
+    var status = document.getElementById('search-status');
+    var latest = 0;
+
+    function update() {
+      var query = input.value;
+      var request = ++latest;
+      search(query).then(function (results) {
+        // Drop the results of queries typed over in the meantime
+        if (request === latest) {
+          render(results, query, list, status);
+        }
+      }).catch(function () {
+        status.textContent = 'Search is unavailable right now.';
+      });
+    }
+
+    form.addEventListener('submit', function (event) {
+      event.preventDefault();
+      history.replaceState(null, '', '?q=' + encodeURIComponent(input.value));
+      update();
+    });
+    input.addEventListener('input', update);
+
+    input.value = new URLSearchParams(location.search).get('q') || '';
+    if (input.value) {
+      update();
+    }
+    input.focus();
+  });
+})();